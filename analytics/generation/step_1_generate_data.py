@@ -8,22 +8,37 @@ full pipeline can call it as `analytics/generation/step_1_generate_data.py`.
 from __future__ import annotations
 
 import argparse
+import gzip
 import json
+import multiprocessing
 import os
 import random
+import shlex
 import shutil
+import string
 import subprocess
 import sys
-import time
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:  # optional speedup; fall back to stdlib json
+    orjson = None
+
 ROOT = Path(__file__).resolve().parents[2]
 SYN_ORIG = ROOT / "synthea_original"
 JAR = SYN_ORIG / "build" / "libs" / "synthea-with-dependencies.jar"
 PROP = SYN_ORIG / "src" / "main" / "resources" / "synthea.properties"
 TEMP_OUT = ROOT / "output"
+# JVM flags for Synthea: start with a sizeable heap and let it grow to most of
+# the machine/container memory (the JVM default caps it at 25%), so the
+# generator's worker threads don't spend the run in GC.
+JAVA_OPTS = "-Xms512m -XX:MaxRAMPercentage=75"
 
 # Deterministic city distribution for generated patients. Edit here to change
 # the target cities and their percentage shares (must sum to 100).
@@ -37,6 +52,43 @@ for _city_name, _pct in CITY_DISTRIBUTION:
 if not CITY_LIST:
     CITY_LIST = ["Vancouver"]
 
+# Fixed part of every patched address; city and postalCode vary per patient.
+_ADDR_TEMPLATE = {"state": "British Columbia", "country": "CA"}
+
+# Bulk GCS uploads: one shared storage.Client driven by transfer_manager's
+# worker pool. Transient errors (429/5xx) are retried per object with
+# exponential backoff, so nothing sleeps unless GCS actually pushes back.
+UPLOAD_WORKERS = 16
+UPLOAD_RETRY_DEADLINE = 120
+NDJSON_BUFFER = 1 << 20
+# NDJSON is written gzipped and stored with Content-Encoding: gzip; GCS (and
+# gsutil) decompress transparently on read. Level 3 keeps CPU cost low.
+NDJSON_GZIP_LEVEL = 3
+_STORAGE_CLIENT = None
+
+# Batch uploads run in the background so batch N's upload overlaps batch N+1's
+# Synthea run; wait_for_uploads() drains them.
+_UPLOAD_POOL = ThreadPoolExecutor(max_workers=2)
+_PENDING_UPLOADS: List[Future] = []
+
+
+def _loads(raw: bytes):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _dumps_line(obj) -> bytes:
+    """Serialize `obj` as one compact NDJSON line (bytes, trailing newline)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _dumps_pretty(obj) -> bytes:
+    """Serialize `obj` as 2-space indented JSON (bytes)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+
 
 def build_jar():
     """Run the Gradle wrapper to create the fat jar if it's missing."""
@@ -47,33 +99,171 @@ def build_jar():
     subprocess.check_call([str(gw), "clean", "shadowJar", "-x", "test"], cwd=str(SYN_ORIG))
 
 
-def run_synthea(patients: int, seed: Optional[int]) -> Path:
-    """Run the synthea jar to generate `patients` and return the fhir output dir."""
+# Synthea JVMs in flight, so main can stop a look-ahead batch when it fails.
+_SYNTHEA_PROCS: set = set()
+_SYNTHEA_LOCK = threading.Lock()
+_SYNTHEA_STOP = threading.Event()
+
+
+def _check_call(cmd: List[str]) -> None:
+    """subprocess.check_call, but registered so stop_synthea() can kill it."""
+    with _SYNTHEA_LOCK:
+        if _SYNTHEA_STOP.is_set():
+            raise RuntimeError("synthea run cancelled")
+        proc = subprocess.Popen(cmd, cwd=str(ROOT))
+        _SYNTHEA_PROCS.add(proc)
+    try:
+        rc = proc.wait()
+    finally:
+        with _SYNTHEA_LOCK:
+            _SYNTHEA_PROCS.discard(proc)
+    if rc != 0:
+        raise subprocess.CalledProcessError(rc, cmd)
+
+
+def stop_synthea() -> None:
+    """Terminate running Synthea JVMs and refuse to start new ones."""
+    with _SYNTHEA_LOCK:
+        _SYNTHEA_STOP.set()
+        procs = list(_SYNTHEA_PROCS)
+    for proc in procs:
+        proc.terminate()
+
+
+def run_synthea(patients: int, seed: Optional[int], out_base: Path = TEMP_OUT, java_opts: str = JAVA_OPTS) -> Path:
+    """Run the synthea jar to generate `patients` under `out_base` and return the fhir output dir.
+
+    Each batch gets its own `out_base` (see main), so nothing has to be
+    deleted before the next run starts.
+    """
     if not JAR.exists():
         raise FileNotFoundError(f"JAR not found: {JAR}")
 
-    # clean temp output
-    if TEMP_OUT.exists():
-        shutil.rmtree(TEMP_OUT)
-    TEMP_OUT.mkdir(parents=True, exist_ok=True)
+    # clean temp output (only left over from an earlier, interrupted run)
+    if out_base.exists():
+        shutil.rmtree(out_base)
+    out_base.mkdir(parents=True, exist_ok=True)
 
-    args = ["-c", str(PROP), "-p", str(patients)]
+    # --exporter.baseDirectory comes after -c so it wins over the properties file
+    args = ["-c", str(PROP), "-p", str(patients), "--exporter.baseDirectory", f"{out_base}/"]
     if seed is not None:
         args = ["-s", str(seed)] + args
 
+    java = ["java", *shlex.split(java_opts)]
     # primary attempt: British Columbia / Vancouver
-    primary_cmd = ["java", f"-Dexporter.baseDirectory={ROOT}", "-jar", str(JAR), *args, "British Columbia", "Vancouver"]
-    fallback_cmd = ["java", f"-Dexporter.baseDirectory={ROOT}", "-jar", str(JAR), *args, "Washington", "Seattle"]
+    primary_cmd = [*java, f"-Dexporter.baseDirectory={out_base}/", "-jar", str(JAR), *args, "British Columbia", "Vancouver"]
+    fallback_cmd = [*java, f"-Dexporter.baseDirectory={out_base}/", "-jar", str(JAR), *args, "Washington", "Seattle"]
 
     try:
         print("Running synthea (BC/Vancouver)...")
-        subprocess.check_call(primary_cmd, cwd=str(ROOT))
+        _check_call(primary_cmd)
     except subprocess.CalledProcessError as e:
+        if _SYNTHEA_STOP.is_set():
+            raise
         print("Primary run failed, falling back to Washington/Seattle model (will map to Vancouver later).", file=sys.stderr)
         print("Error:", e, file=sys.stderr)
-        subprocess.check_call(fallback_cmd, cwd=str(ROOT))
+        _check_call(fallback_cmd)
 
-    return TEMP_OUT / "fhir"
+    return out_base / "fhir"
+
+
+def _postal_codes(n: int, prefix: str, rng: random.Random) -> List[str]:
+    """Return `n` postal codes of the form <prefix><digit><letter><digit>."""
+    digits = rng.choices("123456789", k=2 * n)
+    letters = rng.choices(string.ascii_uppercase, k=n)
+    return [f"{prefix}{digits[2 * i]}{letters[i]}{digits[2 * i + 1]}" for i in range(n)]
+
+
+def _city_for(idx: int) -> str:
+    """Deterministic city for patient number `idx` (1-based) from CITY_LIST."""
+    return CITY_LIST[(idx - 1) % len(CITY_LIST)] if CITY_LIST else "Vancouver"
+
+
+def _set_city(path: Path, city: str, human_readable: bool = False) -> None:
+    """Rewrite the city of every patched address in an already written patient file.
+
+    Only needed when a skipped input shifts later patients to a new number.
+    """
+    def _patch(res) -> None:
+        address = res.get("address") if isinstance(res, dict) else None
+        if isinstance(address, dict):
+            address = [address]
+        if isinstance(address, list):
+            for addr in address:
+                addr["city"] = city
+
+    if path.suffix == ".ndjson":
+        with gzip.open(path, "rb") as f:
+            resources = [_loads(line) for line in f if line.strip()]
+        for res in resources:
+            _patch(res)
+        with path.open("wb", buffering=NDJSON_BUFFER) as raw, \
+                gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=NDJSON_GZIP_LEVEL) as out:
+            for res in resources:
+                out.write(_dumps_line(res))
+        return
+    data = _loads(path.read_bytes())
+    for entry in data.get("entry", ()) if isinstance(data, dict) else ():
+        _patch(entry.get("resource"))
+    path.write_bytes(_dumps_pretty(data) if human_readable else _dumps_line(data))
+
+
+def _process_one(task: tuple) -> Optional[Path]:
+    """Patch one Synthea bundle and write it to out_dir; runs in a worker process.
+
+    `task` is (path, idx, out_dir, postal_code, city, emit_ndjson, human_readable).
+    Returns the written path, or None if the input could not be processed.
+    """
+    f, idx, out_dir, postal_code, city, emit_ndjson, human_readable = task
+    try:
+        raw = f.read_bytes()
+        data = _loads(raw)
+    except Exception as ex:
+        print(f"Skipping unreadable {f}: {ex}")
+        return None
+    # cheap scan of the raw bytes: bundles without any address skip the patch walk
+    has_address = b'"address"' in raw
+    del raw
+
+    # patch addresses
+    addr_override = {**_ADDR_TEMPLATE, "city": city, "postalCode": postal_code}
+    for entry in data.get("entry", ()) if isinstance(data, dict) else ():
+        res = entry.get("resource")
+        if not res:
+            continue
+        # attach a generated timestamp to each resource if not present
+        try:
+            gen_ts = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+            if isinstance(res, dict):
+                res.setdefault("meta", {})
+                if "generated" not in res.get("meta", {}):
+                    res["meta"]["generated"] = gen_ts
+        except Exception:
+            # never fail generation because of metadata writing
+            pass
+        if not has_address:
+            continue
+        address = res.get("address")
+        if isinstance(address, list):
+            for addr in address:
+                addr.update(addr_override)
+        elif isinstance(address, dict):
+            address.update(addr_override)
+
+    out_file = out_dir / f"patient_{idx:04d}.json"
+    if not emit_ndjson:
+        # compact by default; indented only when a human is going to read it
+        out_file.write_bytes(_dumps_pretty(data) if human_readable else _dumps_line(data))
+        return out_file
+    # Uploading: write the NDJSON form straight from the patched bundle
+    # (one resource per line) instead of re-reading an indented JSON copy.
+    nd_name = out_file.with_suffix('.ndjson')
+    try:
+        _write_ndjson(data, nd_name)
+    except Exception as e:
+        print(f"Failed to write {nd_name}: {e}", file=sys.stderr)
+        return None
+    return nd_name
 
 
 def modify_and_copy(
@@ -85,130 +275,176 @@ def modify_and_copy(
     gcs_bucket: Optional[str] = None,
     gcs_prefix: Optional[str] = None,
     delete_local: bool = False,
+    upload_workers: int = UPLOAD_WORKERS,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+    human_readable: bool = False,
 ) -> int:
     """Modify generated FHIR patient bundles to Vancouver addresses and copy into out_dir.
 
+    Bundles are independent, so they are patched in parallel across `workers`
+    processes (default: CPU count). When uploading, each patient is written
+    directly as `patient_NNNN.ndjson` (no indented JSON copy) and the batch is
+    queued for upload on a background pool, so it overlaps the next Synthea
+    run (call `wait_for_uploads()` before relying on GCS contents); with
+    `delete_local` the NDJSON is removed after a successful upload. Local JSON
+    is compact unless `human_readable` asks for 2-space indentation.
+
     Returns number of patients written.
     """
     out_dir.mkdir(parents=True, exist_ok=True)
-    files = sorted([p for p in fhir_dir.glob("*.json") if not p.name.startswith(("practitioner", "hospital"))])
+    with os.scandir(fhir_dir) as it:
+        names = sorted(
+            e.name for e in it if e.name.endswith(".json") and not e.name.startswith(("practitioner", "hospital"))
+        )
+    files = [fhir_dir / name for name in names]
+    emit_ndjson = bool(upload and gcs_bucket)
+    # postal codes for the whole batch up front, from one RNG seeded per batch
+    rng = random.Random(seed + start_index if seed is not None else None)
+    postal_codes = _postal_codes(len(files), postal_prefix, rng)
+    tasks = []
+    for idx, (f, postal_code) in enumerate(zip(files, postal_codes), start_index):
+        city = _city_for(idx)
+        tasks.append((f, idx, out_dir, postal_code, city, emit_ndjson, human_readable))
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        # spawn, not fork: background upload threads may be running by now
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=ctx) as ex:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            results = list(ex.map(_process_one, tasks, chunksize=chunksize))
+    else:
+        results = [_process_one(t) for t in tasks]
+
+    # Keep patient numbering contiguous when an input had to be skipped.
     written = 0
-    idx = start_index
-    for f in files:
-        try:
-            data = json.loads(f.read_text())
-        except Exception as ex:
-            print(f"Skipping unreadable {f}: {ex}")
+    pending: List[Path] = []
+    for task, out_path in zip(tasks, results):
+        if out_path is None:
             continue
-
-        # patch addresses
-        postal_code = f"{postal_prefix}{random.randint(1,9)}{random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')}{random.randint(1,9)}"
-        # deterministic city assignment from CITY_LIST based on patient index
-        city = CITY_LIST[(idx - 1) % len(CITY_LIST)] if CITY_LIST else "Vancouver"
-        if "entry" in data:
-            for entry in data["entry"]:
-                res = entry.get("resource")
-                if not res:
-                    continue
-                # attach a generated timestamp to each resource if not present
-                try:
-                    gen_ts = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
-                    if isinstance(res, dict):
-                        res.setdefault("meta", {})
-                        if "generated" not in res.get("meta", {}):
-                            res["meta"]["generated"] = gen_ts
-                except Exception:
-                    # never fail generation because of metadata writing
-                    pass
-                if "address" in res:
-                    if isinstance(res["address"], list):
-                        for addr in res["address"]:
-                            addr["city"] = city
-                            addr["state"] = "British Columbia"
-                            addr["country"] = "CA"
-                            addr["postalCode"] = postal_code
-                    elif isinstance(res["address"], dict):
-                        addr = res["address"]
-                        addr["city"] = city
-                        addr["state"] = "British Columbia"
-                        addr["country"] = "CA"
-                        addr["postalCode"] = postal_code
-
-        out_file = out_dir / f"patient_{idx:04d}.json"
-        out_file.write_text(json.dumps(data, indent=2))
-
-        # If requested, convert/upload/delete per-patient immediately to reduce local disk usage
-        if upload and gcs_bucket:
-            nd_name = out_file.with_suffix('.ndjson')
-            try:
-                # create NDJSON lines: one resource JSON per line
-                _convert_json_to_ndjson(out_file, nd_name)
-            except Exception as e:
-                print(f"Failed to convert {out_file} -> {nd_name}: {e}", file=sys.stderr)
-            else:
-                try:
-                    print(f"Uploading {nd_name.name} (patient {idx}) to gs://{gcs_bucket}/{gcs_prefix or ''}/")
-                    sys.stdout.flush()
-                    _upload_to_gcs(nd_name, gcs_bucket, gcs_prefix or "")
-                    print(f"Uploaded {nd_name.name}")
-                except Exception as e:
-                    print(f"Failed to upload {nd_name} to GCS: {e}", file=sys.stderr)
-                finally:
-                    # remove the temporary ndjson file to save space
-                    try:
-                        nd_name.unlink()
-                    except Exception:
-                        pass
-
-                if delete_local:
-                    try:
-                        out_file.unlink()
-                    except Exception:
-                        pass
-
-                # brief pause to avoid overwhelming environment/GCS
-                if upload_delay := getattr(modify_and_copy, '_upload_delay', None):
-                    time.sleep(upload_delay)
-
-        idx += 1
+        final_idx = start_index + written
+        target = out_path.with_name(f"patient_{final_idx:04d}{out_path.suffix}")
+        if target != out_path:
+            out_path.rename(target)
+            # the city was picked from the input position; follow the new number
+            if _city_for(final_idx) != task[4]:
+                _set_city(target, _city_for(final_idx), human_readable)
         written += 1
+        if emit_ndjson:
+            pending.append(target)
+
+    if pending:
+        print(f"Queued upload of {len(pending)} NDJSON files to gs://{gcs_bucket}/{gcs_prefix or ''}/ ({upload_workers} workers)")
+        sys.stdout.flush()
+        _PENDING_UPLOADS.append(
+            _UPLOAD_POOL.submit(_upload_batch, pending, gcs_bucket, gcs_prefix or "", upload_workers, delete_local)
+        )
 
     return written
 
 
-def _convert_json_to_ndjson(json_path: Path, ndjson_path: Path) -> int:
-    """Convert a Synthea per-patient JSON bundle into an NDJSON file (one resource per line).
+def _upload_batch(paths: List[Path], bucket: str, prefix: str, max_workers: int, delete_local: bool) -> int:
+    """Upload one batch of NDJSON files (runs on the background upload pool).
+
+    Returns number of files uploaded.
+    """
+    uploaded = 0
+    for nd_name, err in _upload_many(paths, bucket, prefix, max_workers).items():
+        if err is not None:
+            print(f"Failed to upload {nd_name} to GCS: {err}", file=sys.stderr)
+            continue
+        uploaded += 1
+        print(f"Uploaded {nd_name.name}")
+        if delete_local:
+            try:
+                nd_name.unlink()
+            except Exception:
+                pass
+    return uploaded
+
+
+def wait_for_uploads() -> int:
+    """Block until every queued batch upload has finished; return files uploaded."""
+    wait(_PENDING_UPLOADS)
+    uploaded = 0
+    for fut in _PENDING_UPLOADS:
+        try:
+            uploaded += fut.result()
+        except Exception as e:
+            print(f"Batch upload failed: {e}", file=sys.stderr)
+    _PENDING_UPLOADS.clear()
+    return uploaded
+
+
+def _write_ndjson(data: dict, ndjson_path: Path) -> int:
+    """Write a Synthea per-patient bundle as a gzipped NDJSON file (one resource per line).
 
     Returns number of lines written.
     """
-    data = json.loads(json_path.read_text())
     count = 0
-    with ndjson_path.open("w", encoding="utf-8") as out:
+    # large buffer: compressed output lands in memory, flushed in ~1 MiB chunks
+    with ndjson_path.open("wb", buffering=NDJSON_BUFFER) as raw, \
+            gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=NDJSON_GZIP_LEVEL) as out:
         # If this appears to be a bundle with 'entry' list, write each entry.resource
         if isinstance(data, dict) and "entry" in data and isinstance(data["entry"], list):
             for entry in data["entry"]:
                 res = entry.get("resource")
                 if res is None:
                     continue
-                out.write(json.dumps(res, separators=(",", ":"), ensure_ascii=False))
-                out.write("\n")
+                out.write(_dumps_line(res))
                 count += 1
         else:
             # otherwise write the whole object as one line
-            out.write(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
-            out.write("\n")
+            out.write(_dumps_line(data))
             count = 1
     return count
 
 
-def _upload_to_gcs(local_path: Path, bucket: str, prefix: str) -> None:
+def _gcs_bucket(bucket: str, pool_size: int = UPLOAD_WORKERS):
+    """Return a Bucket handle backed by a single, lazily created storage.Client.
+
+    The client's HTTP session is shared by every upload worker, so its
+    connection pool is sized to the worker count; requests' default of 10
+    would otherwise drop keep-alive connections (and redo TLS) under load.
+    """
+    global _STORAGE_CLIENT
+    if _STORAGE_CLIENT is None:
+        from google.cloud import storage
+        from requests.adapters import HTTPAdapter
+        client = storage.Client()
+        size = max(10, pool_size)
+        client._http.mount("https://", HTTPAdapter(pool_connections=size, pool_maxsize=size))
+        _STORAGE_CLIENT = client
+    return _STORAGE_CLIENT.bucket(bucket)
+
+
+def _upload_many(paths: List[Path], bucket: str, prefix: str, max_workers: int = UPLOAD_WORKERS) -> Dict[Path, Optional[BaseException]]:
+    """Upload files from one local directory to gs://bucket/prefix/ in bulk.
+
+    Uses transfer_manager's worker pool over the shared client; each object
+    retries transient errors with exponential backoff. Returns a map of
+    path -> exception (None on success).
+    """
+    from google.api_core import retry
+    from google.cloud.storage import transfer_manager
+
     dest_prefix = prefix.strip("/") if prefix else ""
-    if dest_prefix:
-        dest = f"gs://{bucket}/{dest_prefix}/{local_path.name}"
-    else:
-        dest = f"gs://{bucket}/{local_path.name}"
-    # Use gsutil to copy; let subprocess surface any errors
-    subprocess.check_call(["gsutil", "cp", str(local_path), dest])
+    # plain uploads are not retried by default (no generation precondition)
+    upload_retry = retry.Retry(
+        predicate=retry.if_transient_error, initial=0.5, multiplier=2, maximum=10, timeout=UPLOAD_RETRY_DEADLINE
+    )
+    results = transfer_manager.upload_many_from_filenames(
+        _gcs_bucket(bucket, max_workers),
+        [p.name for p in paths],
+        source_directory=str(paths[0].parent),
+        blob_name_prefix=f"{dest_prefix}/" if dest_prefix else "",
+        upload_kwargs={"content_type": "application/x-ndjson", "retry": upload_retry},
+        additional_blob_attributes={"content_encoding": "gzip"},
+        worker_type=transfer_manager.THREAD,
+        max_workers=max(1, max_workers),
+    )
+    return {p: res if isinstance(res, BaseException) else None for p, res in zip(paths, results)}
 
 
 def main(argv=None):
@@ -218,10 +454,15 @@ def main(argv=None):
     parser.add_argument("--seed", type=int, default=42)
     parser.add_argument("--out-dir", type=str, default="analytics/test_output")
     parser.add_argument("--build-if-missing", action="store_true", help="Run Gradle to build the JAR if missing")
-    parser.add_argument("--upload", action="store_true", help="Convert per-patient JSON to NDJSON and upload to GCS")
+    parser.add_argument("--upload", action="store_true", help="Write per-patient gzipped NDJSON (instead of JSON) and upload to GCS")
     parser.add_argument("--gcs-bucket", type=str, default="synthea-raw-hospigen", help="GCS bucket to upload per-patient NDJSON files to")
     parser.add_argument("--gcs-prefix", type=str, default="patients", help="GCS prefix (folder) under the bucket to upload files to")
-    parser.add_argument("--delete-local", action="store_true", help="Delete per-patient JSON files locally after successful upload")
+    parser.add_argument("--delete-local", action="store_true", help="Delete per-patient NDJSON files locally after successful upload")
+    parser.add_argument("--human-readable", action="store_true", help="Indent per-patient JSON (default: compact; ignored with --upload)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for patching bundles (default: CPU count)")
+    parser.add_argument("--upload-workers", type=int, default=UPLOAD_WORKERS, help="Number of concurrent GCS uploads")
+    parser.add_argument("--synthea-tmp", type=str, default=str(TEMP_OUT), help="Scratch dir for raw Synthea output; point at tmpfs (e.g. /dev/shm/hospigen_out) to keep the write + read-back in RAM")
+    parser.add_argument("--java-opts", type=str, default=JAVA_OPTS, help=f"JVM flags for the Synthea run (default: {JAVA_OPTS!r})")
     parser.add_argument("--stage", action="store_true", help="After generation/upload, run analytics/generation/step_3_materialize_tables.sh to load into BigQuery")
     args = parser.parse_args(argv)
 
@@ -237,6 +478,11 @@ def main(argv=None):
         else:
             raise FileNotFoundError(f"synthea jar not found at {JAR}; set --build-if-missing to build it")
 
+    # Batches go in a private dir under --synthea-tmp; only that dir is removed
+    # at the end, never the (possibly shared, e.g. /dev/shm) scratch root.
+    synthea_tmp = Path(args.synthea_tmp)
+    synthea_tmp.mkdir(parents=True, exist_ok=True)
+    run_tmp = Path(tempfile.mkdtemp(prefix="synthea_", dir=synthea_tmp))
     total = args.total
     batch = args.batch_size
     seed = args.seed
@@ -245,38 +491,74 @@ def main(argv=None):
     batch_idx = 0
     patient_counter = 1
 
-    while generated_total < total:
-        this_count = min(batch, total - generated_total)
-        print(f"\n=== Batch {batch_idx+1}: generating {this_count} patients ===")
-        try:
-            fhir_dir = run_synthea(this_count, seed + batch_idx if seed is not None else None)
-        except Exception as e:
-            print(f"Synthea run failed for batch {batch_idx+1}: {e}", file=sys.stderr)
-            raise
+    # per-batch Synthea output is removed off the critical path; joined at the end
+    cleanups: List[threading.Thread] = []
+    # Synthea runs one batch ahead on this thread (the JVM is a subprocess, so
+    # it overlaps with patching + uploading the current batch).
+    synthea_pool = ThreadPoolExecutor(max_workers=1)
 
-        if not fhir_dir.exists():
-            raise RuntimeError(f"Expected FHIR output directory not found: {fhir_dir}")
-
-        written = modify_and_copy(
-            fhir_dir,
-            out_dir,
-            start_index=patient_counter,
-            upload=args.upload,
-            gcs_bucket=args.gcs_bucket,
-            gcs_prefix=args.gcs_prefix,
-            delete_local=args.delete_local,
+    def start_batch(idx: int, count: int) -> tuple:
+        print(f"\n=== Batch {idx+1}: generating {count} patients ===")
+        run = synthea_pool.submit(
+            run_synthea, count, seed + idx if seed is not None else None, run_tmp / f"batch_{idx}", args.java_opts
         )
-        generated_total += written
-        patient_counter += written
+        return run, count
 
-        # cleanup temp output
-        try:
-            shutil.rmtree(TEMP_OUT)
-        except Exception:
-            pass
+    next_run = None
+    # On any error (including in patching/upload) stop the look-ahead batch,
+    # so the process doesn't sit waiting for a Synthea run nobody will use.
+    try:
+        while generated_total < total:
+            if next_run is None:
+                next_run = start_batch(batch_idx, min(batch, total - generated_total))
+            run, this_count = next_run
+            try:
+                fhir_dir = run.result()
+            except Exception as e:
+                print(f"Synthea run failed for batch {batch_idx+1}: {e}", file=sys.stderr)
+                raise
+
+            if not fhir_dir.exists():
+                raise RuntimeError(f"Expected FHIR output directory not found: {fhir_dir}")
+
+            remaining = total - generated_total - this_count
+            next_run = start_batch(batch_idx + 1, min(batch, remaining)) if remaining > 0 else None
+
+            written = modify_and_copy(
+                fhir_dir,
+                out_dir,
+                start_index=patient_counter,
+                upload=args.upload,
+                gcs_bucket=args.gcs_bucket,
+                gcs_prefix=args.gcs_prefix,
+                delete_local=args.delete_local,
+                upload_workers=args.upload_workers,
+                seed=seed,
+                workers=args.workers,
+                human_readable=args.human_readable,
+            )
+            generated_total += written
+            patient_counter += written
+
+            # cleanup this batch's temp output in the background
+            cleanup = threading.Thread(target=shutil.rmtree, args=(fhir_dir.parent, True))
+            cleanup.start()
+            cleanups.append(cleanup)
+
+            batch_idx += 1
+    except BaseException:
+        stop_synthea()
+        raise
+    finally:
+        synthea_pool.shutdown(cancel_futures=True)
+    for cleanup in cleanups:
+        cleanup.join()
+    shutil.rmtree(run_tmp)
 
-        batch_idx += 1
-        time.sleep(0.1)
+    if args.upload:
+        print("Waiting for background uploads to finish...")
+        uploaded = wait_for_uploads()
+        print(f"Uploaded {uploaded} NDJSON files to gs://{args.gcs_bucket}/{args.gcs_prefix}/")
 
     summary = {
         "requested": total,
@@ -286,28 +568,6 @@ def main(argv=None):
     (out_dir / "vancouver_generation_summary.json").write_text(json.dumps(summary, indent=2))
     print(f"\n✓ Completed: wrote {generated_total} patients to {out_dir}")
 
-    # Optional: convert per-patient JSON files into NDJSON (one resource per line) and upload to GCS
-    if args.upload:
-        print(f"Converting per-patient JSON files in {out_dir} to NDJSON and uploading to gs://{args.gcs_bucket}/{args.gcs_prefix}/")
-        json_files = sorted([p for p in out_dir.glob("patient_*.json")])
-        if not json_files:
-            print("No per-patient JSON files found to upload.")
-            return
-        for jf in json_files:
-            nd_name = jf.with_suffix('.ndjson').name
-            nd_local = out_dir / nd_name
-            try:
-                lines = _convert_json_to_ndjson(jf, nd_local)
-            except Exception as e:
-                print(f"Failed to convert {jf} -> {nd_local}: {e}", file=sys.stderr)
-                continue
-            try:
-                _upload_to_gcs(nd_local, args.gcs_bucket, args.gcs_prefix)
-            except Exception as e:
-                print(f"Failed to upload {nd_local} to GCS: {e}", file=sys.stderr)
-                continue
-            print(f"Uploaded {nd_local.name} ({lines} lines) to gs://{args.gcs_bucket}/{args.gcs_prefix}/")
-
     # If requested, run the staging + materialize script to load GCS NDJSON into BigQuery
     if args.stage:
         stage_script = ROOT / "analytics" / "generation" / "step_3_materialize_tables.sh"
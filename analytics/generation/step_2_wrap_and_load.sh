@@ -48,35 +48,93 @@ fi
 
 TMPDIR=$(mktemp -d)
 
-if [[ -n "$FILE" ]]; then
-  echo "Downloading single NDJSON file gs://$BUCKET/$PREFIX/$FILE to $TMPDIR"
-  gsutil -q cp "gs://$BUCKET/$PREFIX/$FILE" "$TMPDIR/" || true
-else
-  echo "Downloading NDJSON files from gs://$BUCKET/$PREFIX/*.ndjson to $TMPDIR"
-  gsutil -m cp "gs://$BUCKET/$PREFIX/*.ndjson" "$TMPDIR/" || true
-fi
+# wrap every non-empty line: NDJSON (plain or gzipped) on stdin -> gzipped
+# wrapped NDJSON on stdout. bq load reads .gz sources as-is; level 1 is
+# nearly free and gets most of the size reduction for the upload.
+wrap_lines(){
+  gzip -cdf | awk 'BEGIN{ORS=""} {if(length($0)>0) print "{\"raw\":" $0 "}\n"}' | gzip -1
+}
 
-for f in "$TMPDIR"/*.ndjson; do
-  [[ -f "$f" ]] || continue
-  base=$(basename "$f")
-  wrapped="$TMPDIR/wrapped_${base}"
-  echo "Wrapping $base -> $(basename "$wrapped")"
-  # wrap every non-empty line
-  awk 'BEGIN{ORS=""} {if(length($0)>0) print "{\"raw\":" $0 "}\n"}' "$f" > "$wrapped"
+# BigQuery load jobs are per-table quota'd and slow to start, so wrapped files
+# are loaded together: one job per LOAD_GROUP URIs (keeps the comma-joined
+# URI list well under the per-argument size limit).
+LOAD_GROUP=${LOAD_GROUP:-500}
 
-  wrapped_gs_path="gs://$BUCKET/$WRAPPED_PREFIX/$(basename "$wrapped")"
+# upload one wrapped file; returns 1 (and uploads nothing) if it already exists
+upload_wrapped(){
+  local wrapped="$1"
+  local wrapped_gs_path="gs://$BUCKET/$WRAPPED_PREFIX/$(basename "$wrapped")"
   # skip upload/load if wrapped file already exists
   if gsutil -q stat "$wrapped_gs_path" 2>/dev/null; then
     echo "Wrapped file already exists: $wrapped_gs_path - skipping upload/load"
-    continue
+    return 1
   fi
 
   echo "Uploading wrapped file to $wrapped_gs_path"
   gsutil -q cp "$wrapped" "$wrapped_gs_path"
+}
 
-  echo "Loading wrapped NDJSON into BigQuery staging table ${PROJECT}:synthea_raw.raw_records_stg (append for this file)"
-  bq --location="$LOCATION" load --source_format=NEWLINE_DELIMITED_JSON "${PROJECT}:synthea_raw.raw_records_stg" "$wrapped_gs_path" raw:JSON || true
-done
+# load the given gs:// URIs into the staging table, LOAD_GROUP per job
+load_uris(){
+  local uris=("$@")
+  local i group batch
+  for (( i = 0; i < ${#uris[@]}; i += LOAD_GROUP )); do
+    batch=("${uris[@]:i:LOAD_GROUP}")
+    group=$(IFS=,; echo "${batch[*]}")
+    echo "Loading ${#batch[@]} wrapped NDJSON file(s) into BigQuery staging table ${PROJECT}:synthea_raw.raw_records_stg (append)"
+    bq --location="$LOCATION" load --source_format=NEWLINE_DELIMITED_JSON "${PROJECT}:synthea_raw.raw_records_stg" "$group" raw:JSON || true
+  done
+}
+
+if [[ -n "$FILE" ]]; then
+  # Stream the object straight into the wrapper: no local copy of the source file.
+  wrapped="$TMPDIR/wrapped_${FILE}.gz"
+  echo "Wrapping gs://$BUCKET/$PREFIX/$FILE -> $(basename "$wrapped")"
+  if gsutil cat "gs://$BUCKET/$PREFIX/$FILE" | wrap_lines > "$wrapped"; then
+    if upload_wrapped "$wrapped"; then
+      load_uris "gs://$BUCKET/$WRAPPED_PREFIX/$(basename "$wrapped")"
+    fi
+  else
+    echo "Failed to read gs://$BUCKET/$PREFIX/$FILE - skipping" >&2
+  fi
+else
+  echo "Downloading NDJSON files from gs://$BUCKET/$PREFIX/*.ndjson to $TMPDIR"
+  gsutil -m cp "gs://$BUCKET/$PREFIX/*.ndjson" "$TMPDIR/" || true
+
+  # one listing of the wrapped prefix instead of a gsutil stat per file
+  EXISTING=$(gsutil ls "gs://$BUCKET/$WRAPPED_PREFIX/" 2>/dev/null || true)
+  mkdir -p "$TMPDIR/wrapped"
+  LOAD_URIS=()
+  for f in "$TMPDIR"/*.ndjson; do
+    [[ -f "$f" ]] || continue
+    base=$(basename "$f")
+    # skip files that look already-wrapped
+    if [[ "$base" == *-wrapped.ndjson ]]; then
+      echo "Skipping already-wrapped file $base"
+      continue
+    fi
+    wrapped_gs_path="gs://$BUCKET/$WRAPPED_PREFIX/wrapped_${base}.gz"
+    # skip upload/load if wrapped file already exists
+    if grep -qxF "$wrapped_gs_path" <<<"$EXISTING"; then
+      echo "Wrapped file already exists: $wrapped_gs_path - skipping upload/load"
+      continue
+    fi
+    echo "Wrapping $base -> wrapped_${base}.gz"
+    wrap_lines < "$f" > "$TMPDIR/wrapped/wrapped_${base}.gz"
+    LOAD_URIS+=("$wrapped_gs_path")
+  done
+
+  if (( ${#LOAD_URIS[@]} )); then
+    echo "Uploading ${#LOAD_URIS[@]} wrapped file(s) to gs://$BUCKET/$WRAPPED_PREFIX/ (parallel)"
+    gsutil -m -q cp "$TMPDIR/wrapped/"*.ndjson.gz "gs://$BUCKET/$WRAPPED_PREFIX/"
+    if [[ -z "$EXISTING" ]]; then
+      # fresh wrapped prefix: everything under it is new, one wildcard job loads it all
+      load_uris "gs://$BUCKET/$WRAPPED_PREFIX/wrapped_*.ndjson.gz"
+    else
+      load_uris "${LOAD_URIS[@]}"
+    fi
+  fi
+fi
 
 echo "Cleaning temporary files"
 rm -rf "$TMPDIR"
@@ -54,27 +54,20 @@ if ! bq --location="$LOCATION" show "${FULL_DS}.raw_records_stg" >/dev/null 2>&1
 fi
 
 echo "Quick tip: to inspect one uploaded file, run locally:"
-echo "  gsutil cat ${GLOB} | head -n1"
+echo "  gsutil cat ${GLOB} | gzip -cdf | head -n1"
 
-echo "3) Loading NDJSON files from ${GLOB} into ${DS}.raw_records_stg (one file at a time)"
+echo "3) Loading NDJSON files from ${GLOB} into ${DS}.raw_records_stg (batched load jobs)"
 
 FILES=$(gsutil ls "gs://${BUCKET}/${PREFIX}/*.ndjson" 2>/dev/null || true)
 if [[ -z "$FILES" ]]; then
   echo "No NDJSON files found at gs://${BUCKET}/${PREFIX}"
 else
-  for f in $FILES; do
-    # skip files that look already-wrapped
-    if [[ "$f" == *-wrapped.ndjson ]]; then
-      echo "Skipping already-wrapped file $f"
-      continue
-    fi
-    echo "Processing $f"
-    fname=$(basename "$f")
-    bash "$(dirname "$0")/step_2_wrap_and_load.sh" --bucket "$BUCKET" --prefix "$PREFIX" --file "$fname" --wrapped-prefix "${PREFIX}/${fname%.ndjson}_wrapped" --project "$PROJECT" --location "$LOCATION"
-  done
+  # one step_2 run wraps every file and loads them together instead of a
+  # bq load job per patient file
+  bash "$(dirname "$0")/step_2_wrap_and_load.sh" --bucket "$BUCKET" --prefix "$PREFIX" --project "$PROJECT" --location "$LOCATION"
 fi
 
-echo "All per-file loads submitted — check BigQuery job outputs for errors if any."
+echo "All loads submitted — check BigQuery job outputs for errors if any."
 
 echo "4) Materialize (MERGE) patients table from staging"
 
@@ -1,12 +1,25 @@
-import os, json, base64, hashlib, typing as t
+import os, json, time, asyncio, hashlib, functools, typing as t
+from collections import OrderedDict
 from datetime import datetime, timezone
-import requests
+import httpx
 import google.auth
 from google.auth.transport.requests import Request as GAuthRequest
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
 from google.cloud import pubsub_v1
+from google.cloud.pubsub_v1.publisher.exceptions import FlowControlLimitError
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as JSONResponse
+except ImportError:  # optional speedup; fall back to stdlib json
+    orjson = None
+    from fastapi.responses import JSONResponse
+
+try:
+    import pybase64 as base64  # SIMD decoder, same API as the stdlib module
+except ImportError:
+    import base64
 
 app = FastAPI()
 
@@ -31,15 +44,75 @@ RPM_OBS_CREATED_TOPIC      = os.getenv("RPM_OBS_CREATED_TOPIC",      "rpm.observ
 
 LOGIC_ID = os.getenv("LOGIC_ID", "bridge.router.v4")
 
-PUBLISHER = pubsub_v1.PublisherClient()
+# Ack the push once the message is handed to the batcher rather than after the
+# publish round trip. Failures after that point are only logged (the push is
+# already acked), so this trades at-least-once delivery for latency; off by
+# default. A message the batcher refuses outright (flow control full) is still
+# answered 429, which also bounds how much can be outstanding.
+ACK_BEFORE_PUBLISH = os.getenv("ACK_BEFORE_PUBLISH", "0").lower() in ("1", "true", "yes")
+
+# Concurrent pushes share batches: a message waits at most ~10 ms for others
+# to join it before the batch goes out, instead of one RTT per message.
+# Past the flow-control limits publish() fails fast (ERROR, not BLOCK: it is
+# called on the event loop) and the push is answered 429 so Pub/Sub redelivers.
+PUBLISHER = pubsub_v1.PublisherClient(
+    batch_settings=pubsub_v1.types.BatchSettings(
+        max_messages=100,
+        max_bytes=1_000_000,
+        max_latency=0.01,
+    ),
+    publisher_options=pubsub_v1.types.PublisherOptions(
+        flow_control=pubsub_v1.types.PublishFlowControl(
+            message_limit=1000,
+            byte_limit=10_000_000,
+            limit_exceeded_behavior=pubsub_v1.types.LimitExceededBehavior.ERROR,
+        ),
+    ),
+)
+
+# Shared keep-alive pool for Healthcare API fetches; awaited, so concurrent
+# pushes don't block the event loop on each other's round trips.
+FHIR_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+FHIR_CLIENT = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    timeout=10.0,
+)
+_FHIR_CREDS = None
+
+# Notifications for the same resource arrive repeatedly (redeliveries, retries),
+# so remember the last body per URL and revalidate it with If-None-Match.
+# FHIR_CACHE_TTL > 0 also serves hits without a round trip for that many
+# seconds; off by default since an update reuses the same name.
+FHIR_CACHE_MAX = int(os.getenv("FHIR_CACHE_MAX", "4096"))
+FHIR_CACHE_TTL = float(os.getenv("FHIR_CACHE_TTL", "0"))
+_FHIR_CACHE: "OrderedDict[str, tuple[float, str, dict, bytes]]" = OrderedDict()
 
 # -----------------------------
 # Utilities
 # -----------------------------
-def now_iso() -> str:
-    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+def _loads(raw: t.Union[bytes, str]):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+def _dumps(obj) -> bytes:
+    """Compact JSON as UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
 
+_ISO_CACHE: t.Tuple[int, str] = (0, "")
+
+def now_iso() -> str:
+    # Second resolution, so format once per second rather than per call.
+    global _ISO_CACHE
+    sec = int(time.time())
+    if _ISO_CACHE[0] != sec:
+        _ISO_CACHE = (sec, datetime.fromtimestamp(sec, timezone.utc).isoformat())
+    return _ISO_CACHE[1]
+
+@functools.lru_cache(maxsize=1)
 def get_project_id() -> str:
+    # Resolved once per process; credential discovery can hit the metadata server.
     if PROJECT_ENV:
         return PROJECT_ENV
     creds, project_id = google.auth.default()
@@ -51,18 +124,48 @@ def topic_path(topic: str, project_id: t.Optional[str] = None) -> str:
     pid = project_id or get_project_id()
     return f"projects/{pid}/topics/{topic}"
 
-def fetch_fhir_resource_by_name(name: str) -> dict:
+async def _fhir_token() -> str:
+    """Access token for the Healthcare API; refreshed (off the loop) only when expired."""
+    global _FHIR_CREDS
+    loop = asyncio.get_running_loop()
+    if _FHIR_CREDS is None:
+        _FHIR_CREDS, _ = await loop.run_in_executor(None, lambda: google.auth.default(scopes=FHIR_SCOPES))
+    if not _FHIR_CREDS.valid:
+        await loop.run_in_executor(None, _FHIR_CREDS.refresh, GAuthRequest())
+    return _FHIR_CREDS.token
+
+async def fetch_fhir_resource_by_name(name: str) -> t.Tuple[dict, bytes]:
+    """Return the parsed resource and its compact JSON bytes."""
     # name like projects/.../fhirStores/.../fhir/Observation/xyz
     url = name if name.startswith("https://") else f"https://healthcare.googleapis.com/v1/{name}"
-    creds, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
-    creds.refresh(GAuthRequest())
+    hit = _FHIR_CACHE.get(url)
+    if hit is not None and time.monotonic() - hit[0] < FHIR_CACHE_TTL:
+        _FHIR_CACHE.move_to_end(url)
+        return hit[2], hit[3]
     headers = {
-        "Authorization": f"Bearer {creds.token}",
+        "Authorization": f"Bearer {await _fhir_token()}",
         "Accept": "application/fhir+json",
     }
-    r = requests.get(url, headers=headers, timeout=10)
-    r.raise_for_status()
-    return r.json()
+    if hit is not None:
+        headers["If-None-Match"] = hit[1]
+    r = await FHIR_CLIENT.get(url, headers=headers)
+    if r.status_code == 304 and hit is not None:
+        res, raw = hit[2], hit[3]
+    else:
+        r.raise_for_status()
+        raw = r.content
+        res = _loads(raw)
+        # The API pretty-prints by default; keep the envelope's resource
+        # compact like inline pushes (compact JSON never has a raw newline).
+        if b"\n" in raw:
+            raw = _dumps(res)
+    etag = r.headers.get("ETag") or (hit[1] if hit is not None and r.status_code == 304 else None)
+    if etag and FHIR_CACHE_MAX > 0:
+        _FHIR_CACHE[url] = (time.monotonic(), etag, res, raw)
+        _FHIR_CACHE.move_to_end(url)
+        while len(_FHIR_CACHE) > FHIR_CACHE_MAX:
+            _FHIR_CACHE.popitem(last=False)
+    return res, raw
 
 def resource_patient_ref(res: dict) -> t.Optional[str]:
     # Common case
@@ -78,41 +181,56 @@ def resource_patient_ref(res: dict) -> t.Optional[str]:
                 return ref
     return None
 
+_EMPTY: dict = {}
+
 def occurred_at(res: dict) -> str:
     rt = res.get("resourceType")
+    lu = (res.get("meta") or _EMPTY).get("lastUpdated")
     if rt == "Observation":
-        return res.get("effectiveDateTime") or res.get("issued") or res.get("meta", {}).get("lastUpdated") or now_iso()
+        return res.get("effectiveDateTime") or res.get("issued") or lu or now_iso()
     if rt == "ServiceRequest":
-        return res.get("authoredOn") or res.get("meta", {}).get("lastUpdated") or now_iso()
+        return res.get("authoredOn") or lu or now_iso()
     if rt == "MedicationRequest":
-        return res.get("authoredOn") or res.get("meta", {}).get("lastUpdated") or now_iso()
+        return res.get("authoredOn") or lu or now_iso()
     if rt == "MedicationAdministration":
         eff = res.get("effectiveDateTime")
         if eff:
             return eff
-        period = res.get("effectivePeriod") or {}
-        return period.get("start") or res.get("meta", {}).get("lastUpdated") or now_iso()
+        period = res.get("effectivePeriod") or _EMPTY
+        return period.get("start") or lu or now_iso()
     if rt == "Procedure":
         perf = res.get("performedDateTime")
         if perf:
             return perf
-        pp = res.get("performedPeriod") or {}
-        return pp.get("start") or res.get("meta", {}).get("lastUpdated") or now_iso()
+        pp = res.get("performedPeriod") or _EMPTY
+        return pp.get("start") or lu or now_iso()
     if rt == "DocumentReference":
-        return res.get("date") or res.get("meta", {}).get("lastUpdated") or now_iso()
+        return res.get("date") or lu or now_iso()
     if rt == "Appointment":
-        return res.get("start") or res.get("meta", {}).get("lastUpdated") or now_iso()
+        return res.get("start") or lu or now_iso()
     if rt == "Encounter":
-        per = res.get("period") or {}
-        return per.get("start") or res.get("meta", {}).get("lastUpdated") or now_iso()
-    return res.get("meta", {}).get("lastUpdated") or now_iso()
-
-def build_envelope(topic: str, res: dict) -> dict:
+        per = res.get("period") or _EMPTY
+        return per.get("start") or lu or now_iso()
+    return lu or now_iso()
+
+@functools.lru_cache(maxsize=64)
+def _event_hasher(rtype: str):
+    # sha256 state seeded with the per-type prefix; callers hash a copy.
+    return hashlib.sha256(f"{rtype}:".encode("utf-8"))
+
+@functools.lru_cache(maxsize=4096)
+def event_id_for(rtype: str, rid: str, occ: str) -> str:
+    """sha256 of "rtype:rid:occ" as hex."""
+    h = _event_hasher(rtype).copy()
+    h.update(f"{rid}:{occ}".encode("utf-8"))
+    return h.hexdigest()
+
+def build_envelope(topic: str, res: dict, raw: t.Optional[bytes] = None) -> dict:
+    # `raw` is the resource's compact JSON, used verbatim when available.
     rid = res.get("id", "no-id")
     rtype = res.get("resourceType", "Unknown")
     occ = occurred_at(res)
-    event_hash_src = f"{rtype}:{rid}:{occ}".encode("utf-8")
-    event_id = hashlib.sha256(event_hash_src).hexdigest()
+    event_id = event_id_for(str(rtype), str(rid), str(occ))
     env = {
         "event_id": event_id,
         "topic": topic,
@@ -121,7 +239,7 @@ def build_envelope(topic: str, res: dict) -> dict:
         "patient_ref": resource_patient_ref(res),
         "resource_type": rtype,
         "resource_id": rid,
-        "resource": json.dumps(res, separators=(",", ":")),
+        "resource": (raw if raw is not None else _dumps(res)).decode("utf-8"),
         "provenance": {
             "source_system": "gcp.fhir.changes",
             "logic_id": LOGIC_ID,
@@ -134,43 +252,49 @@ def build_envelope(topic: str, res: dict) -> dict:
 # -----------------------------
 # Routing helpers
 # -----------------------------
+OBS_CATEGORY_SYSTEMS = frozenset((
+    "http://terminology.hl7.org/codesystem/observation-category",
+    "http://terminology.hl7.org/CodeSystem/observation-category",
+    "http://hl7.org/fhir/observation-category",
+))
+
+VITALS = frozenset({
+    ("http://loinc.org", "59408-5"),  # SpO2
+    ("http://loinc.org", "8867-4"),   # HR
+    ("http://loinc.org", "9279-1"),   # RR
+    ("http://loinc.org", "8310-5"),   # Temp
+    ("http://loinc.org", "8480-6"),   # Systolic BP
+    ("http://loinc.org", "8462-4"),   # Diastolic BP
+    ("http://loinc.org", "8302-2"),   # Height
+    ("http://loinc.org", "29463-7"),  # Weight
+    ("http://loinc.org", "39156-5"),  # BMI
+})
+
 def choose_topic_for_observation(res: dict, action: t.Optional[str] = None) -> t.Optional[str]:
     status = (res.get("status") or "").lower()
 
-    # category: 'laboratory' vs 'vital-signs'
-    cat_codes: list[str] = []
-    for cat in res.get("category", []) or []:
-        for c in (cat.get("coding") or []):
-            sys = (c.get("system") or "").lower()
-            if sys in (
-                "http://terminology.hl7.org/codesystem/observation-category",
-                "http://terminology.hl7.org/CodeSystem/observation-category",
-                "http://hl7.org/fhir/observation-category",
-            ):
+    # category: 'laboratory' wins outright; 'vital-signs' is remembered
+    is_vitals = False
+    for cat in res.get("category") or ():
+        for c in (cat.get("coding") or ()):
+            if (c.get("system") or "").lower() in OBS_CATEGORY_SYSTEMS:
                 code = (c.get("code") or "").lower()
-                if code:
-                    cat_codes.append(code)
-
-    is_lab = "laboratory" in cat_codes
-    is_vitals = "vital-signs" in cat_codes
-
-    # fallback by known LOINC codes
-    codes = {(c.get("system"), c.get("code")) for c in (res.get("code", {}).get("coding") or [])}
-    VITALS = {
-        ("http://loinc.org", "59408-5"),  # SpO2
-        ("http://loinc.org", "8867-4"),   # HR
-        ("http://loinc.org", "9279-1"),   # RR
-        ("http://loinc.org", "8310-5"),   # Temp
-        ("http://loinc.org", "8480-6"),   # Systolic BP
-        ("http://loinc.org", "8462-4"),   # Diastolic BP
-        ("http://loinc.org", "8302-2"),   # Height
-        ("http://loinc.org", "29463-7"),  # Weight
-        ("http://loinc.org", "39156-5"),  # BMI
-    }
-    is_loinc = any((s or '').lower() == 'http://loinc.org' for (s, _) in codes)
-    is_known_vitals = len(codes & VITALS) > 0
-
-    if is_lab or (is_loinc and not is_known_vitals):
+                if code == "laboratory":
+                    return RESULTS_FINAL_TOPIC if status == "final" else RESULTS_PRELIM_TOPIC
+                if code == "vital-signs":
+                    is_vitals = True
+
+    # fallback by known LOINC codes; one known vital settles it
+    is_loinc = is_known_vitals = False
+    for c in (res.get("code", {}).get("coding") or ()):
+        s = c.get("system")
+        if (s, c.get("code")) in VITALS:
+            is_known_vitals = True
+            break
+        if (s or "").lower() == "http://loinc.org":
+            is_loinc = True
+
+    if is_loinc and not is_known_vitals:
         return RESULTS_FINAL_TOPIC if status == "final" else RESULTS_PRELIM_TOPIC
     if is_vitals or is_known_vitals:
         return RPM_OBS_CREATED_TOPIC
@@ -204,14 +328,37 @@ def choose_topic_for_appointment(res: dict, action: t.Optional[str] = None) -> t
         return SCHED_CREATED_TOPIC
     return None
 
+# resourceType -> chooser(res, action); unlisted types have no mapping.
+ROUTES: t.Dict[str, t.Callable[[dict, t.Optional[str]], t.Optional[str]]] = {
+    "Observation":              choose_topic_for_observation,
+    "ServiceRequest":           lambda res, action: ORDERS_CREATED_TOPIC,
+    "MedicationRequest":        lambda res, action: MEDS_ORDERED_TOPIC,
+    "MedicationAdministration": lambda res, action: MEDS_ADMINISTERED_TOPIC,
+    "Procedure":                lambda res, action: PROCEDURES_PERFORMED_TOPIC,
+    "DocumentReference":        lambda res, action: NOTES_CREATED_TOPIC,
+    "Appointment":              choose_topic_for_appointment,
+    "Encounter":                choose_topic_for_encounter,
+}
+
 # -----------------------------
 # Pub/Sub publish
 # -----------------------------
-def publish(topic: str, envelope: dict, project_id: t.Optional[str] = None) -> str:
-    data = json.dumps(envelope, separators=(",", ":")).encode("utf-8")
+def publish_nowait(topic: str, envelope: dict, project_id: t.Optional[str] = None):
+    data = _dumps(envelope)
     tpath = topic_path(topic, project_id)
-    future = PUBLISHER.publish(tpath, data=data, origin="bridge")
-    return future.result(timeout=10)
+    return PUBLISHER.publish(tpath, data=data, origin="bridge")
+
+async def publish(topic: str, envelope: dict, project_id: t.Optional[str] = None) -> str:
+    future = publish_nowait(topic, envelope, project_id)
+    # Yield to the loop while the batcher collects other pushes.
+    return await asyncio.wait_for(asyncio.wrap_future(future), timeout=10)
+
+def _report_publish_failure(topic: str, event_id: str):
+    def _cb(future):
+        exc = future.exception()
+        if exc is not None:
+            print(f"[bridge] publish to {topic} failed for {event_id}: {exc}")
+    return _cb
 
 # -----------------------------
 # Coercion helpers
@@ -221,22 +368,24 @@ def _coerce_resource(v):
         return v
     if isinstance(v, (bytes, bytearray)):
         try:
-            return json.loads(v.decode("utf-8"))
+            return _loads(v)
         except Exception:
             return {"raw": v.decode("utf-8", "ignore")}
     if isinstance(v, str):
         s = v.strip()
         if s and s[0] in "{[":
             try:
-                return json.loads(s)
+                return _loads(s)
             except Exception:
                 return {"raw": s}
         return {"raw": s}
     return {"raw": str(v)}
 
+# Most selective first: inbound FHIR payloads almost never carry "provenance".
+ENVELOPE_KEYS = ("provenance", "event_id", "topic", "resource_type", "resource")
+
 def _looks_like_envelope(obj: dict) -> bool:
-    required = {"event_id", "topic", "resource_type", "resource", "provenance"}
-    return isinstance(obj, dict) and required.issubset(obj.keys())
+    return isinstance(obj, dict) and all(k in obj for k in ENVELOPE_KEYS)
 
 # -----------------------------
 # Endpoints
@@ -248,7 +397,7 @@ async def health():
 @app.post("/pubsub/push")
 async def pubsub_push(request: Request):
     try:
-        body = await request.json()
+        body = _loads(await request.body())
     except Exception:
         return JSONResponse({"status": "error", "reason": "invalid json"}, status_code=400)
 
@@ -260,8 +409,7 @@ async def pubsub_push(request: Request):
         if "data" not in body["message"]:
             return JSONResponse({"status": "error", "reason": "missing data"}, status_code=400)
         try:
-            raw = base64.b64decode(body["message"]["data"]).decode("utf-8")
-            payload = json.loads(raw)
+            payload = _loads(base64.b64decode(body["message"]["data"]))
         except Exception as e:
             return JSONResponse({"status": "error", "reason": f"base64/json decode failed: {e}"}, status_code=400)
     else:
@@ -273,45 +421,42 @@ async def pubsub_push(request: Request):
 
     # FHIR Notifications: payload may be {"name": ".../fhir/Resource/id"}
     project_id = get_project_id()
-    action = attrs.get("action") or payload.get("action") if isinstance(payload, dict) else None
+    action = attrs.get("action")
+    if not action and isinstance(payload, dict):
+        action = payload.get("action")
 
     if isinstance(payload, dict) and "name" in payload:
         try:
-            res = fetch_fhir_resource_by_name(payload["name"])
+            res, raw = await fetch_fhir_resource_by_name(payload["name"])
         except Exception as e:
             return JSONResponse({"status": "error", "reason": f"fetch failed: {e}"}, status_code=500)
     else:
         res = _coerce_resource(payload.get("resource", payload))
+        raw = None
 
     rtype = res.get("resourceType")
     if not rtype:
         return JSONResponse({"status": "ignored", "reason": "no resourceType"}, status_code=200)
 
     # Routing
-    topic: t.Optional[str] = None
-    if rtype == "Observation":
-        topic = choose_topic_for_observation(res, action)
-    elif rtype == "ServiceRequest":
-        topic = ORDERS_CREATED_TOPIC
-    elif rtype == "MedicationRequest":
-        topic = MEDS_ORDERED_TOPIC
-    elif rtype == "MedicationAdministration":
-        topic = MEDS_ADMINISTERED_TOPIC
-    elif rtype == "Procedure":
-        topic = PROCEDURES_PERFORMED_TOPIC
-    elif rtype == "DocumentReference":
-        topic = NOTES_CREATED_TOPIC
-    elif rtype == "Appointment":
-        topic = choose_topic_for_appointment(res, action)
-    elif rtype == "Encounter":
-        topic = choose_topic_for_encounter(res, action)
+    route = ROUTES.get(rtype)
+    topic: t.Optional[str] = route(res, action) if route else None
 
     if not topic:
         return JSONResponse({"status": "ignored", "reason": "no mapping"}, status_code=200)
 
-    env = build_envelope(topic, res)
+    env = build_envelope(topic, res, raw)
     try:
-        mid = publish(topic, env, project_id=project_id)
+        if ACK_BEFORE_PUBLISH:
+            future = publish_nowait(topic, env, project_id=project_id)
+            # Rejected up front (flow control full): don't ack, let it redeliver.
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+            future.add_done_callback(_report_publish_failure(topic, env["event_id"]))
+            return JSONResponse({"status": "ok", "published_to": topic, "project": project_id}, status_code=200)
+        mid = await publish(topic, env, project_id=project_id)
         return JSONResponse({"status": "ok", "published_to": topic, "project": project_id, "messageId": mid}, status_code=200)
+    except FlowControlLimitError as e:
+        return JSONResponse({"status": "error", "reason": f"publisher busy: {e}"}, status_code=429)
     except Exception as e:
         return JSONResponse({"status": "error", "reason": f"publish failed: {e}"}, status_code=500)
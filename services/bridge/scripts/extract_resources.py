@@ -11,12 +11,50 @@ one resource JSON per line to the output file.
 """
 from __future__ import annotations
 import argparse
+import io
 import json
+import mmap
+import multiprocessing
+import os
+import re
 import sys
-from typing import Any, IO
+from typing import Any, IO, Iterable, Iterator, List, Optional, Tuple, Union
 
+try:
+    # Streaming parser (picks the yajl2_c backend when available)
+    import ijson
+except ImportError:
+    ijson = None
 
-def process_bundle_obj(obj: Any, out_f: IO[str]) -> int:
+try:
+    import orjson
+except ImportError:  # optional speedup; fall back to stdlib json
+    orjson = None
+
+_WS = re.compile(r'\s*')
+
+# NDJSON files are mmapped and converted in ~CHUNK_BYTES groups of lines;
+# inputs at least PARALLEL_MIN_BYTES large spread the groups over a process
+# pool (smaller ones are not worth the worker startup).
+PARALLEL_MIN_BYTES = 8 << 20
+CHUNK_BYTES = 1 << 20
+# Output is written through a large buffer so per-resource writes don't each
+# become a syscall.
+OUT_BUFFER = 4 << 20
+
+
+def _loads(raw: Union[str, bytes]) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _dumps_line(obj: Any) -> bytes:
+    """Serialize `obj` as one compact NDJSON line (bytes, trailing newline)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def process_bundle_obj(obj: Any, out_f: IO[bytes]) -> int:
     if not isinstance(obj, dict):
         return 0
     entries = obj.get("entry")
@@ -29,61 +67,190 @@ def process_bundle_obj(obj: Any, out_f: IO[str]) -> int:
         r = e.get("resource")
         if r is None:
             continue
-        out_f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        out_f.write(_dumps_line(r))
         count += 1
     return count
 
 
-def process_resource_obj(obj: Any, out_f: IO[str]) -> int:
+def process_resource_obj(obj: Any, out_f: IO[bytes]) -> int:
     # obj is already a resource (has resourceType or id)
     if not isinstance(obj, dict):
         return 0
     if 'resourceType' in obj or 'id' in obj:
-        out_f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        out_f.write(_dumps_line(obj))
         return 1
     return 0
 
 
-def extract_from_file(input_path: str, out_path: str) -> int:
+def stream_bundle_resources(input_path: str, out_f: IO[bytes]) -> int:
+    """Write entry[].resource of a single Bundle file without loading the whole tree.
+
+    Peak memory is bounded by the largest resource rather than the file size.
+    Raises if the file is not a single JSON document (e.g. NDJSON).
+    """
+    count = 0
+    with open(input_path, 'rb') as inf:
+        for r in ijson.items(inf, 'entry.item.resource', use_float=True):
+            if r is None:
+                continue
+            out_f.write(_dumps_line(r))
+            count += 1
+    return count
+
+
+def extract_concatenated(text: str, out_f: IO[bytes]) -> int:
+    """Write resources from `text` in a single pass over its JSON values.
+
+    Handles a single Bundle document, NDJSON and back-to-back objects alike
+    using JSONDecoder.raw_decode; invalid lines are skipped.
+    """
+    dec = json.JSONDecoder()
     total = 0
-    with open(input_path, 'r', encoding='utf-8') as inf, open(out_path, 'w', encoding='utf-8') as outf:
-        # Try reading whole file as JSON bundle first
+    seen = 0
+    i, n = 0, len(text)
+    while True:
+        i = _WS.match(text, i).end()
+        if i >= n:
+            break
+        try:
+            obj, end = dec.raw_decode(text, i)
+        except ValueError:
+            # ignore invalid lines
+            nl = text.find('\n', i)
+            if nl < 0:
+                break
+            i = nl + 1
+            continue
+        if seen == 0 and _WS.match(text, end).end() >= n:
+            # the whole input is one document (usually a Bundle)
+            return process_bundle_obj(obj, out_f) or process_resource_obj(obj, out_f)
+        seen += 1
+        total += process_bundle_obj(obj, out_f)
+        total += process_resource_obj(obj, out_f)
+        i = end
+    return total
+
+
+def convert_lines(lines: Iterable[Union[str, bytes]]) -> Tuple[bytes, int]:
+    """Convert NDJSON lines (Bundles or Resources) to resource NDJSON bytes.
+
+    Returns (data, resource count).
+    """
+    buf = io.BytesIO()
+    total = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
         try:
-            inf.seek(0)
-            obj = json.load(inf)
-            n = process_bundle_obj(obj, outf)
-            if n > 0:
-                return n
+            obj = _loads(line)
         except Exception:
-            inf.seek(0)
-        # Fall back to line-by-line NDJSON processing
+            # ignore invalid lines
+            continue
+        total += process_bundle_obj(obj, buf)
+        total += process_resource_obj(obj, buf)
+    return buf.getvalue(), total
+
+
+def _line_chunks(inf: IO[bytes], size: int = CHUNK_BYTES) -> Iterator[List[bytes]]:
+    chunk: List[bytes] = []
+    nbytes = 0
+    for line in inf:
+        chunk.append(line)
+        nbytes += len(line)
+        if nbytes >= size:
+            yield chunk
+            chunk, nbytes = [], 0
+    if chunk:
+        yield chunk
+
+
+def convert_chunk(chunk: bytes) -> Tuple[bytes, int]:
+    """convert_lines over a group of raw NDJSON bytes; runs in pool workers."""
+    return convert_lines(chunk.split(b'\n'))
+
+
+def _byte_chunks(mm: mmap.mmap, size: int = CHUNK_BYTES) -> Iterator[bytes]:
+    """Slice `mm` into ~`size` byte groups, each ending on a line boundary."""
+    start, n = 0, len(mm)
+    while start < n:
+        end = start + size
+        if end >= n:
+            end = n
+        else:
+            nl = mm.find(b'\n', end)
+            end = n if nl < 0 else nl + 1
+        yield mm[start:end]
+        start = end
+
+
+def _looks_like_ndjson(input_path: str) -> bool:
+    """True if the first non-empty line is a complete JSON value and more lines follow."""
+    with open(input_path, 'rb') as inf:
         for line in inf:
-            line = line.strip()
-            if not line:
-                continue
+            if line.strip():
+                try:
+                    _loads(line)
+                except ValueError:
+                    return False
+                break
+        else:
+            return False
+        return any(line.strip() for line in inf)
+
+
+def extract_ndjson(input_path: str, out_f: IO[bytes], workers: int = 1) -> int:
+    """Convert an NDJSON file read through mmap (no per-line str decoding).
+
+    With `workers` > 1 the line groups are converted on a process pool; output
+    keeps input order either way.
+    """
+    total = 0
+    with open(input_path, 'rb') as inf, mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                results = pool.imap(convert_chunk, _byte_chunks(mm))
+                for data, n in results:
+                    out_f.write(data)
+                    total += n
+        else:
+            for data, n in map(convert_chunk, _byte_chunks(mm)):
+                out_f.write(data)
+                total += n
+    return total
+
+
+def extract_from_file(input_path: str, out_path: str, workers: Optional[int] = None) -> int:
+    workers = workers or os.cpu_count() or 1
+    with open(out_path, 'wb', buffering=OUT_BUFFER) as outf:
+        # Try streaming the file as a single JSON bundle first
+        if ijson is not None:
             try:
-                obj = json.loads(line)
+                n = stream_bundle_resources(input_path, outf)
+                if n > 0:
+                    return n
             except Exception:
-                # ignore invalid lines
-                continue
-            total += process_bundle_obj(obj, outf)
-            total += process_resource_obj(obj, outf)
-    return total
+                # discard anything streamed before the parse error
+                outf.seek(0)
+                outf.truncate()
+        # NDJSON: chunked over mmap, on all cores when the file is large
+        if _looks_like_ndjson(input_path):
+            if os.path.getsize(input_path) < PARALLEL_MIN_BYTES:
+                workers = 1
+            return extract_ndjson(input_path, outf, workers)
+        # One read, one parse: bundle or NDJSON
+        with open(input_path, 'r', encoding='utf-8') as inf:
+            text = inf.read()
+        return extract_concatenated(text, outf)
 
 
 def extract_from_stdin(out_path: str) -> int:
     total = 0
-    with open(out_path, 'w', encoding='utf-8') as outf:
-        for line in sys.stdin:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-            except Exception:
-                continue
-            total += process_bundle_obj(obj, outf)
-            total += process_resource_obj(obj, outf)
+    with open(out_path, 'wb', buffering=OUT_BUFFER) as outf:
+        for chunk in _line_chunks(sys.stdin.buffer):
+            data, n = convert_lines(chunk)
+            outf.write(data)
+            total += n
     return total
 
 
@@ -91,10 +258,11 @@ def main() -> None:
     p = argparse.ArgumentParser(description='Extract resources from bundle JSON/NDJSON')
     p.add_argument('--input', '-i', help='Input file path (optional). If omitted, reads stdin')
     p.add_argument('--output', '-o', required=True, help='Output NDJSON file (one resource per line)')
+    p.add_argument('--workers', '-j', type=int, default=None, help='Processes for large NDJSON inputs (default: CPU count)')
     args = p.parse_args()
 
     if args.input:
-        n = extract_from_file(args.input, args.output)
+        n = extract_from_file(args.input, args.output, args.workers)
     else:
         n = extract_from_stdin(args.output)
 
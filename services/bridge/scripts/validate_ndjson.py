@@ -6,28 +6,99 @@ Usage:
 
 Prints parsing errors (first N) and exits with non-zero if any found.
 """
+import os
 import sys
 import json
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
+from typing import Optional
 
+try:
+    import orjson
+except ImportError:  # optional speedup; fall back to stdlib json
+    orjson = None
 
-def validate(path: Path, max_err: int = 5):
+# Files at least this large are validated in shards on a process pool.
+PARALLEL_MIN_BYTES = 8 << 20
+
+
+def _check(s: bytes) -> None:
+    if orjson is not None:
+        # parses bytes directly and rejects invalid UTF-8 itself
+        orjson.loads(s)
+    else:
+        # decode strictly to surface invalid encoding
+        json.loads(s.decode('utf-8'))
+
+
+def _validate_range(path: Path, start: int, end: int, max_err: int):
+    """Check the lines in bytes [start, end) of `path`.
+
+    Returns (non-empty lines checked, lines seen, bad) where each bad entry is
+    (line number within the range, error, sample, non-empty lines checked so far).
+    Stops after `max_err` errors.
+    """
     bad = []
     total = 0
-    with path.open('rb') as f:
-        for i, raw in enumerate(f, 1):
-            s = raw.rstrip(b"\n\r")
+    i = 0
+    with path.open('rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        while pos < end:
+            i += 1
+            nl = mm.find(b"\n", pos, end)
+            stop = end if nl < 0 else nl
+            s = mm[pos:stop].rstrip(b"\r")
+            pos = stop + 1
             if not s.strip():
                 continue
             total += 1
             try:
-                # decode strictly to surface invalid encoding
-                text = s.decode('utf-8')
-                json.loads(text)
+                _check(s)
             except Exception as e:
-                bad.append((i, str(e), s[:200]))
+                bad.append((i, str(e), s[:200], total))
                 if len(bad) >= max_err:
                     break
+    return total, i, bad
+
+
+def _shards(path: Path, size: int, n: int):
+    """Split [0, size) into up to `n` ranges that each end on a line boundary."""
+    bounds = [0]
+    with path.open('rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for k in range(1, n):
+            nl = mm.find(b"\n", max(size * k // n, bounds[-1]))
+            if nl < 0:
+                break
+            bounds.append(nl + 1)
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def validate(path: Path, max_err: int = 5, workers: Optional[int] = None):
+    size = path.stat().st_size
+    if size == 0:
+        return 0, []
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or size < PARALLEL_MIN_BYTES:
+        total, _, bad = _validate_range(path, 0, size, max_err)
+        return total, [b[:3] for b in bad]
+    # Shards are checked on all cores; merging in file order keeps the report
+    # (and the count at the max_err-th error) identical to a sequential scan.
+    starts, ends = zip(*_shards(path, size, workers))
+    with ProcessPoolExecutor(workers) as pool:
+        results = list(pool.map(_validate_range, repeat(path), starts, ends, repeat(max_err)))
+    total = 0
+    lines = 0
+    bad = []
+    for shard_total, shard_lines, shard_bad in results:
+        for ln, err, sample, seen in shard_bad:
+            bad.append((lines + ln, err, sample))
+            if len(bad) >= max_err:
+                return total + seen, bad
+        total += shard_total
+        lines += shard_lines
     return total, bad
 
 
@@ -14,6 +14,9 @@ class GenerateRequest(BaseModel):
     seed: Optional[int] = None
     dry_run: bool = False
     max_qps: float = 3.0
+    max_in_flight: int = Field(8, ge=1, le=64)
+    bundles_per_request: int = Field(1, ge=1, le=100, description="Patient bundles merged into one transaction")
+    max_retries: int = Field(3, ge=0, le=10)
     country: str = Field("CA", description="Country code: 'CA' or 'US'")
 
 @app.get("/healthz")
@@ -34,9 +37,12 @@ async def generate(req: GenerateRequest):
         max_qps=req.max_qps,
         fhir_store=fhir_store,
         country=req.country,
+        max_in_flight=req.max_in_flight,
+        bundles_per_request=req.bundles_per_request,
+        max_retries=req.max_retries,
     )
     try:
-        result = execute(cfg)
+        result = await execute(cfg)
         return result
     except Exception as e:
         raise HTTPException(500, detail=str(e))
@@ -4,12 +4,32 @@ import importlib
 
 MODE = os.environ.get("MODE", "service").lower()
 
+PROVINCE_NAMES = {
+    "BC": "British Columbia",
+    "AB": "Alberta",
+    "SK": "Saskatchewan",
+    "MB": "Manitoba",
+    "ON": "Ontario",
+    "QC": "Quebec",
+    "NB": "New Brunswick",
+    "NS": "Nova Scotia",
+    "PE": "Prince Edward Island",
+    "NL": "Newfoundland and Labrador",
+    "YT": "Yukon",
+    "NT": "Northwest Territories",
+    "NU": "Nunavut",
+}
+# Lower-cased code or full name -> demographics spelling
+PROVINCE_LOOKUP = {k.lower(): v for k, v in PROVINCE_NAMES.items()}
+PROVINCE_LOOKUP.update({v.lower(): v for v in PROVINCE_NAMES.values()})
+
 if MODE == "service":
     from services.synthea_runner.app import app
     uvicorn = importlib.import_module("uvicorn")
-    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "8080")))
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "8080")), loop="uvloop", http="httptools")
 else:
     # job mode - read envs and execute once
+    import asyncio
     from services.synthea_runner.runner import RunConfig, execute
     # Read and sanitize geography inputs (strip accidental wrapping quotes)
     def _clean(val: str | None) -> str | None:
@@ -26,44 +46,30 @@ else:
     raw_city = os.environ.get("CITY")
     province = _clean(raw_province)
     city = _clean(raw_city)
-    # Normalize province/city: Cloud Run env may show spaces as underscores in describe output
+    # Normalize province/city: Cloud Run env may show spaces as underscores in describe output.
+    # Province codes (and full names in any case) map to the demographics spelling.
     if province:
         province = province.replace("_", " ")
+        province = PROVINCE_LOOKUP.get(province.lower(), province)
     if city:
         city = city.replace("_", " ")
-    # Expand common Canadian province abbreviations to full names for demographics lookup
-    # while keeping the short code available in a parallel variable if needed in the future.
-    prov_map = {
-        "BC": "British Columbia",
-        "AB": "Alberta",
-        "SK": "Saskatchewan",
-        "MB": "Manitoba",
-        "ON": "Ontario",
-        "QC": "Quebec",
-        "NB": "New Brunswick",
-        "NS": "Nova Scotia",
-        "PE": "Prince Edward Island",
-        "NL": "Newfoundland and Labrador",
-        "YT": "Yukon",
-        "NT": "Northwest Territories",
-        "NU": "Nunavut",
-    }
-    if province in prov_map:
-        province = prov_map[province]
     count = int(os.environ.get("COUNT", "10"))
     seed = os.environ.get("SEED")
     seed_int = int(seed) if seed is not None and seed != "" else None
     dry_run = os.environ.get("DRY_RUN", "false").lower() == "true"
     max_qps = float(os.environ.get("MAX_QPS", "3"))
+    max_in_flight = int(os.environ.get("MAX_IN_FLIGHT", "8"))
+    bundles_per_request = int(os.environ.get("BUNDLES_PER_REQUEST", "1"))
+    max_retries = int(os.environ.get("MAX_RETRIES", "3"))
     fhir_store = os.environ.get("FHIR_STORE") or os.environ.get("STORE_ID_PATH")
     if not fhir_store:
         raise RuntimeError("Missing FHIR_STORE env")
     country = (os.environ.get("COUNTRY") or "CA").upper()
-    cfg = RunConfig(province=province, city=city, count=count, seed=seed_int, dry_run=dry_run, max_qps=max_qps, fhir_store=fhir_store, country=country)
+    cfg = RunConfig(province=province, city=city, count=count, seed=seed_int, dry_run=dry_run, max_qps=max_qps, fhir_store=fhir_store, country=country, max_in_flight=max_in_flight, bundles_per_request=bundles_per_request, max_retries=max_retries)
     print("Env raw values:", {"PROVINCE": raw_province, "CITY": raw_city})
-    print("Starting synthea-runner job once with:", cfg.__dict__)
+    print("Starting synthea-runner job once with:", {k: getattr(cfg, k) for k in RunConfig.__slots__})
     try:
-        res = execute(cfg)
+        res = asyncio.run(execute(cfg))
         print("Result:", res)
     except Exception:
         print("Job execution failed with exception:")
@@ -5,12 +5,21 @@ import glob
 import shlex
 import random
 import asyncio
+import datetime
+import hashlib
 import subprocess
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
 import httpx
-import urllib.request
+
+try:
+    import orjson
+except ImportError:  # optional speedup; fall back to stdlib json
+    orjson = None
 
 ROOT = Path(__file__).resolve().parents[2]
 SYN_DIR = ROOT / "synthea"
@@ -35,7 +44,33 @@ PROP_FILE = CFG_DIR / "synthea-canada.properties"
 
 FHIR_API_BASE = "https://healthcare.googleapis.com/v1"
 
+MAX_RETRIES = 3
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+MAX_RETRY_DELAY = 60.0
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+# Asset downloads are written and resumed in chunks of this size.
+DOWNLOAD_CHUNK = 1 << 20
+# After this many consecutive 5xx/network failures uploads fail fast for
+# BREAKER_COOLDOWN seconds, then a single probe decides whether to resume.
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+# Dry runs with at least this many bundles parse them on a process pool.
+VALIDATE_PARALLEL_MIN = 256
+
+# Access tokens are reused until this many seconds before they expire.
+TOKEN_REFRESH_MARGIN = 60
+_TOKEN: Optional[Tuple[str, float]] = None  # (token, monotonic refresh deadline)
+
+# Countries whose assets were already checked in this process; the lock keeps
+# concurrent service requests from downloading the JAR side by side.
+_ASSETS_READY: set = set()
+_ASSETS_LOCK = threading.Lock()
+
 class RunConfig:
+    __slots__ = ("province", "city", "count", "seed", "dry_run", "max_qps", "fhir_store",
+                 "country", "max_in_flight", "bundles_per_request", "request_bytes", "max_retries")
+
     def __init__(self,
                  province: Optional[str],
                  city: Optional[str],
@@ -44,7 +79,11 @@ class RunConfig:
                  dry_run: bool,
                  max_qps: float,
                  fhir_store: str,
-                 country: str = "CA"):
+                 country: str = "CA",
+                 max_in_flight: int = 8,
+                 bundles_per_request: int = 1,
+                 request_bytes: int = 8_000_000,
+                 max_retries: int = MAX_RETRIES):
         self.province = province
         self.city = city
         self.count = count
@@ -53,9 +92,60 @@ class RunConfig:
         self.max_qps = max_qps
         self.fhir_store = fhir_store.rstrip("/")
         self.country = country.upper()
+        self.max_in_flight = max_in_flight
+        self.bundles_per_request = bundles_per_request
+        self.request_bytes = request_bytes
+        self.max_retries = max_retries
+
+
+def _download(url: str, dest: Path, sha256: Optional[str] = None) -> None:
+    """Fetch `url` into `dest` via a .part file, resuming it with a Range request.
+
+    An interrupted transfer (here or in an earlier run) picks up where the
+    .part file ends. When `sha256` is given the finished file must match it;
+    `dest` only appears, by atomic rename, once the download is complete.
+    """
+    part = dest.with_name(dest.name + ".part")
+    timeout = httpx.Timeout(60.0, connect=10.0)
+    for attempt in range(MAX_RETRIES + 1):
+        offset = part.stat().st_size if part.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+        try:
+            with httpx.stream("GET", url, headers=headers, follow_redirects=True, timeout=timeout) as r:
+                if r.status_code == 416:
+                    # .part already holds the whole file
+                    break
+                r.raise_for_status()
+                # A server that ignores Range answers 200 with the full body
+                with part.open("ab" if r.status_code == 206 else "wb") as f:
+                    for chunk in r.iter_raw(DOWNLOAD_CHUNK):
+                        f.write(chunk)
+            break
+        except httpx.HTTPError as e:
+            if attempt >= MAX_RETRIES:
+                raise
+            delay = min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt))
+            print(f"Download interrupted ({e}); resuming in {delay:.0f}s ...")
+            time.sleep(delay)
+    if sha256:
+        with part.open("rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        if digest != sha256.strip().lower():
+            part.unlink()
+            raise ValueError(f"Checksum mismatch for {url}: expected {sha256}, got {digest}")
+    os.replace(part, dest)
 
 
 def ensure_assets(country: str) -> None:
+    if country.upper() in _ASSETS_READY:
+        return
+    with _ASSETS_LOCK:
+        if country.upper() not in _ASSETS_READY:
+            _ensure_assets(country)
+            _ASSETS_READY.add(country.upper())
+
+
+def _ensure_assets(country: str) -> None:
     if not JAR.exists():
         # Attempt to download the Synthea JAR for local runs
         JAR.parent.mkdir(parents=True, exist_ok=True)
@@ -63,7 +153,7 @@ def ensure_assets(country: str) -> None:
         jar_name = os.environ.get("SYNTH_JAR", "synthea-with-dependencies.jar")
         url = f"https://github.com/synthetichealth/synthea/releases/download/{version}/{jar_name}"
         print(f"Downloading Synthea JAR from {url} to {JAR} ...")
-        urllib.request.urlretrieve(url, str(JAR))
+        _download(url, JAR, os.environ.get("SYNTH_JAR_SHA256"))
         if not JAR.exists():
             raise FileNotFoundError(f"Missing Synthea JAR after download attempt: {JAR}")
     # For CA we require local geography CSVs; for US we rely on built-in resources in the JAR
@@ -77,25 +167,28 @@ def ensure_assets(country: str) -> None:
         raise ValueError(f"Unsupported COUNTRY '{country}'. Only 'CA' and 'US' are supported.")
 
 
-def run_synthea(cfg: RunConfig) -> Path:
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
-    java_opts = [
-        f"-Dexporter.baseDirectory={OUT_DIR}",
-    ]
-    if cfg.country == "CA":
-        # Use CA geography from our resources folder when present; else rely on JAR assets
-        geo_dir = RES_DIR / 'geography'
-        java_opts.insert(0, "-Dgenerate.geography.country_code=CA")
-        if geo_dir.exists():
-            java_opts.insert(0, f"-Dgenerate.geography.directory={geo_dir}")
-            print(f"Using local geography dir: {geo_dir}")
-        else:
-            print("No local geography dir found; relying on Synthea JAR assets for CA")
-    elif cfg.country == "US":
-        # Use built-in US geography (no override directory), but set explicit country code
-        java_opts.insert(0, "-Dgenerate.geography.country_code=US")
-    else:
-        raise ValueError(f"Unsupported COUNTRY '{cfg.country}'. Only 'CA' and 'US' are supported.")
+async def _check_call(cmd: List[str]) -> None:
+    """subprocess.check_call without blocking the event loop; output is inherited."""
+    proc = await asyncio.create_subprocess_exec(*cmd, cwd=str(ROOT))
+    rc = await proc.wait()
+    if rc != 0:
+        raise subprocess.CalledProcessError(rc, cmd)
+
+
+def _modules_dir() -> Optional[Path]:
+    """RES_DIR/modules if it holds any JSON modules, else None (use the JAR's)."""
+    modules_dir = RES_DIR / 'modules'
+    if not modules_dir.is_dir():
+        return None
+    # stop at the first module instead of listing the whole directory
+    with os.scandir(modules_dir) as it:
+        if any(e.name.endswith(".json") for e in it):
+            return modules_dir
+    return None
+
+
+def _build_cmd(cfg: RunConfig, java_opts: List[str], modules_dir: Optional[Path],
+               include_city: bool) -> List[str]:
     # Synthea CLI:
     #  -c <configPath> (local config file)
     #  -p <populationSize>
@@ -105,134 +198,477 @@ def run_synthea(cfg: RunConfig) -> Path:
         "-c", str(PROP_FILE),
         "-p", str(cfg.count),
     ]
-    modules_dir = RES_DIR / 'modules'
-    # Use modules directory only if it contains JSON modules; otherwise rely on defaults in the JAR
-    if modules_dir.exists() and any(modules_dir.glob('*.json')):
+    if modules_dir is not None:
         args += ["-d", str(modules_dir)]
     if cfg.seed is not None:
         args += ["-s", str(cfg.seed)]
     # Positional geography: state/province and city
     if cfg.province:
         args += [cfg.province]
-    if cfg.city:
+    if cfg.city and include_city:
         args += [cfg.city]
-
-    cmd = [
+    return [
         "java",
         *java_opts,
         "-jar", str(JAR),
         *args,
     ]
+
+
+async def run_synthea(cfg: RunConfig) -> Path:
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    java_opts = [
+        f"-Dexporter.baseDirectory={OUT_DIR}",
+    ]
+    if cfg.country == "CA":
+        # Use CA geography from our resources folder when present; else rely on JAR assets
+        geo_dir = RES_DIR / 'geography'
+        java_opts.insert(0, "-Dgenerate.geography.country_code=CA")
+        if geo_dir.exists():
+            java_opts.insert(0, f"-Dgenerate.geography.directory={geo_dir}")
+            print(f"Using local geography dir: {geo_dir}")
+        else:
+            print("No local geography dir found; relying on Synthea JAR assets for CA")
+    elif cfg.country == "US":
+        # Use built-in US geography (no override directory), but set explicit country code
+        java_opts.insert(0, "-Dgenerate.geography.country_code=US")
+    else:
+        raise ValueError(f"Unsupported COUNTRY '{cfg.country}'. Only 'CA' and 'US' are supported.")
+    # Use modules directory only if it contains JSON modules; otherwise rely on defaults in the JAR
+    modules_dir = _modules_dir()
+    cmd = _build_cmd(cfg, java_opts, modules_dir, include_city=True)
     print("Running:", " ".join(shlex.quote(x) for x in cmd))
     try:
-        subprocess.check_call(cmd, cwd=str(ROOT))
+        await _check_call(cmd)
     except subprocess.CalledProcessError as e:
         # If a specific city was requested and Synthea failed to locate it in demographics,
         # retry once with province-only to avoid a hard failure.
         if cfg.city:
             print(f"Synthea failed with city '{cfg.city}' (exit {e.returncode}). Retrying without city...")
-            retry_args = [
-                "java",
-                *java_opts,
-                "-jar", str(JAR),
-                *["-c", str(PROP_FILE), "-p", str(cfg.count)],
-            ]
-            if modules_dir.exists() and any(modules_dir.glob('*.json')):
-                retry_args += ["-d", str(modules_dir)]
-            if cfg.seed is not None:
-                retry_args += ["-s", str(cfg.seed)]
-            if cfg.province:
-                retry_args += [cfg.province]
-            print("Running (fallback):", " ".join(shlex.quote(x) for x in retry_args))
-            subprocess.check_call(retry_args, cwd=str(ROOT))
+            retry_cmd = _build_cmd(cfg, java_opts, modules_dir, include_city=False)
+            print("Running (fallback):", " ".join(shlex.quote(x) for x in retry_cmd))
+            await _check_call(retry_cmd)
         else:
             raise
     return OUT_DIR / "fhir"
 
 
-def iter_transaction_bundles(fhir_dir: Path) -> List[Path]:
-    return sorted(fhir_dir.glob("*.json"))
+def iter_transaction_bundles(fhir_dir: Path) -> Iterator[Path]:
+    # scandir hands back names and types without a stat per entry; paths are
+    # yielded in directory order as they are found, nothing downstream needs
+    # them sorted (shared bundles are picked out by name).
+    if not fhir_dir.is_dir():
+        return
+    with os.scandir(fhir_dir) as it:
+        for e in it:
+            if e.name.endswith(".json") and e.is_file():
+                yield Path(e.path)
 
 
-def get_access_token() -> str:
+def is_shared_bundle(path: Path) -> bool:
+    # hospitalInformation*/practitionerInformation* hold the Organizations and
+    # Practitioners that patient bundles reference conditionally.
+    return path.name.startswith(("hospitalInformation", "practitionerInformation"))
+
+
+def group_bundles(files: List[Path], per_request: int, max_bytes: int) -> List[List[Path]]:
+    """Split `files` into runs of at most `per_request` files and ~`max_bytes` bytes."""
+    groups: List[List[Path]] = []
+    cur: List[Path] = []
+    size = 0
+    for path in files:
+        n = path.stat().st_size
+        if cur and (len(cur) >= per_request or size + n > max_bytes):
+            groups.append(cur)
+            cur, size = [], 0
+        cur.append(path)
+        size += n
+    if cur:
+        groups.append(cur)
+    return groups
+
+
+def bundle_digests(paths: List[Path], fhir_store: str) -> Dict[Path, str]:
+    """blake2b of each file's bytes, salted with the target store."""
+    salt = fhir_store.encode("utf-8") + b"\0"
+    out: Dict[Path, str] = {}
+    for path in paths:
+        h = hashlib.blake2b(salt, digest_size=16)
+        h.update(path.read_bytes())
+        out[path] = h.hexdigest()
+    return out
+
+
+def load_manifest(manifest: Path) -> set:
+    try:
+        return set(manifest.read_text().split())
+    except FileNotFoundError:
+        return set()
+
+
+def _loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _validate_one(path: Path) -> Optional[str]:
+    try:
+        _loads(path.read_bytes())
+        return None
+    except Exception as e:
+        return str(e)
+
+
+def validate_bundles(files: List[Path]) -> List[Tuple[Path, Optional[str]]]:
+    """(path, parse error or None) for each file; parsed on all cores when
+    there are enough files to pay for the worker processes."""
+    workers = os.cpu_count() or 1
+    if workers < 2 or len(files) < VALIDATE_PARALLEL_MIN:
+        return [(p, _validate_one(p)) for p in files]
+    with ProcessPoolExecutor(workers) as ex:
+        return list(zip(files, ex.map(_validate_one, files, chunksize=64)))
+
+
+def merge_bundles(paths: List[Path]) -> bytes:
+    """One transaction Bundle holding the entries of every bundle in `paths`.
+
+    Synthea's urn:uuid fullUrls are unique across patients, so references
+    inside each original bundle still resolve within the merged transaction.
+    """
+    if len(paths) == 1:
+        return paths[0].read_bytes()
+    entries: List[Any] = []
+    for path in paths:
+        entries.extend(_loads(path.read_bytes()).get("entry") or [])
+    return _dumps({"resourceType": "Bundle", "type": "transaction", "entry": entries})
+
+
+def _spill(content: bytes) -> Path:
+    """Write a merged body to a temp file so a retry can resend it without
+    rebuilding it or keeping it in memory during the backoff."""
+    fd, name = tempfile.mkstemp(prefix="bundle_", suffix=".json")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    return Path(name)
+
+
+_ADC = None  # google.auth credentials, kept so refreshes reuse them
+
+
+def _adc_token() -> Optional[Tuple[str, float]]:
+    """(token, lifetime) from Application Default Credentials, in-process."""
+    global _ADC
+    try:
+        import google.auth
+        import google.auth.transport.requests
+    except ImportError:
+        return None
+    try:
+        if _ADC is None:
+            _ADC, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+        if not _ADC.valid:
+            _ADC.refresh(google.auth.transport.requests.Request())
+    except Exception:
+        return None
+    ttl = 3600.0
+    if _ADC.expiry is not None:
+        # google.auth keeps expiry as naive UTC
+        ttl = (_ADC.expiry - datetime.datetime.utcnow()).total_seconds()
+    return _ADC.token, ttl
+
+
+def _fetch_access_token() -> Tuple[str, float]:
+    """Return (token, lifetime in seconds)."""
     # In Cloud Run, use metadata server to get access token for Healthcare API
     try:
-        import requests
-        r = requests.get(
+        r = httpx.get(
             "http://metadata/computeMetadata/v1/instance/service-accounts/default/token",
             headers={"Metadata-Flavor": "Google"}, timeout=1.5,
         )
         if r.status_code == 200:
-            return r.json().get("access_token", "")
+            body = r.json()
+            return body.get("access_token", ""), float(body.get("expires_in", 3600))
     except Exception:
         pass
-    # Fallback locally
+    # Locally, prefer ADC in-process over forking gcloud
+    adc = _adc_token()
+    if adc is not None:
+        return adc
+    # Fallback locally; gcloud hands out one-hour tokens
     token = os.popen("gcloud auth print-access-token").read().strip()
     if not token:
         raise RuntimeError("Unable to obtain access token")
+    return token, 3600.0
+
+
+def _cached_token() -> Optional[str]:
+    if _TOKEN is not None and time.monotonic() < _TOKEN[1]:
+        return _TOKEN[0]
+    return None
+
+
+def get_access_token(stale: Optional[str] = None) -> str:
+    """Access token for the Healthcare API, fetched again only when near expiry
+    or when the cached token is `stale` (rejected by the server)."""
+    global _TOKEN
+    if stale is not None and _TOKEN is not None and _TOKEN[0] == stale:
+        _TOKEN = None
+    token = _cached_token()
+    if token is None:
+        token, ttl = _fetch_access_token()
+        _TOKEN = (token, time.monotonic() + ttl - TOKEN_REFRESH_MARGIN)
     return token
 
 
-async def post_bundle(session: httpx.AsyncClient, fhir_store: str, bundle: Dict[str, Any]) -> httpx.Response:
+class BearerAuth(httpx.Auth):
+    """Sets the cached access token on every request; on a 401 the token is
+    refreshed once and the request replayed."""
+
+    def __init__(self) -> None:
+        self._lock = asyncio.Lock()
+
+    async def _token(self, stale: Optional[str] = None) -> str:
+        # Cheap check first; only one coroutine refreshes, off the event loop.
+        token = _cached_token()
+        if token is not None and token != stale:
+            return token
+        async with self._lock:
+            return await asyncio.to_thread(get_access_token, stale)
+
+    async def async_auth_flow(self, request: httpx.Request):
+        token = await self._token()
+        request.headers["Authorization"] = f"Bearer {token}"
+        response = yield request
+        if response.status_code == 401:
+            request.headers["Authorization"] = f"Bearer {await self._token(stale=token)}"
+            yield request
+
+
+def retry_delay(resp: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying `resp`: the server's Retry-After when
+    it gives one in seconds, else capped exponential backoff with full jitter."""
+    ra = resp.headers.get("Retry-After")
+    if ra:
+        try:
+            return min(max(float(ra), 0.0), MAX_RETRY_DELAY)
+        except ValueError:
+            pass  # HTTP-date form; use our own backoff
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+
+class Breaker:
+    """Circuit breaker for the FHIR endpoint.
+
+    closed: requests go through. open: requests fail fast until the cooldown
+    has passed. half_open: one probe request is let through; its outcome
+    closes the breaker again or reopens it.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consec_fail = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+            return True
+        # open and cooling down, or a probe is already out
+        return False
+
+    def retry_in(self) -> float:
+        """Seconds a refused caller should wait before asking again."""
+        if self.state == "open":
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+        # half_open: poll for the probe's outcome
+        return min(1.0, self.cooldown)
+
+    def record(self, ok: bool) -> None:
+        if ok:
+            self.state = "closed"
+            self.consec_fail = 0
+            return
+        self.consec_fail += 1
+        if self.state == "half_open" or self.consec_fail >= self.threshold:
+            if self.state != "open":
+                print(f"FHIR endpoint failing ({self.consec_fail} in a row); pausing uploads for {self.cooldown:.0f}s")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+def _resolve_endpoint(fhir_store: str) -> httpx.URL:
     # If fhir_store begins with projects/..., prepend API base
     url = fhir_store
     if url.startswith("projects/"):
         url = f"{FHIR_API_BASE}/{url}"
     if not url.endswith("/fhir"):
         url = url + "/fhir"
-    return await session.post(url, json=bundle, timeout=60.0)
+    return httpx.URL(url)
 
 
-async def upload_bundles(fhir_store: str, bundles_dir: Path, max_qps: float, dry_run: bool) -> Dict[str, Any]:
-    files = iter_transaction_bundles(bundles_dir)
+async def post_bundle(session: httpx.AsyncClient, endpoint: httpx.URL, content: bytes) -> httpx.Response:
+    # Bundle files are posted as-is; no parse/re-serialize round trip.
+    return await session.post(endpoint, content=content)
+
+
+async def upload_bundles(fhir_store: str, bundles_dir: Path, max_qps: float, dry_run: bool,
+                         max_in_flight: int = 8, bundles_per_request: int = 1,
+                         request_bytes: int = 8_000_000,
+                         max_retries: int = MAX_RETRIES,
+                         manifest: Optional[Path] = None) -> Dict[str, Any]:
+    # Dedupe and the shared-first ordering need the whole set before any POST.
+    files = list(iter_transaction_bundles(bundles_dir))
+    skipped = 0
     success = 0
     failed = 0
     errors: List[str] = []
 
     # If dry_run, just count bundles and return without network calls
     if dry_run:
-        for path in files:
-            try:
-                with path.open("r") as f:
-                    json.load(f)
+        for path, err in await asyncio.to_thread(validate_bundles, files):
+            if err is None:
                 success += 1
-            except Exception as e:
+            else:
                 failed += 1
-                errors.append(f"{path.name}: {e}")
+                errors.append(f"{path.name}: {err}")
         return {"success": success, "failed": failed, "errors": errors[:20]}
 
-    headers = {"Authorization": f"Bearer {get_access_token()}"}
-    async with httpx.AsyncClient(headers=headers) as session:
-        interval = 1.0 / max_qps if max_qps > 0 else 0
-        for path in files:
-            try:
-                with path.open("r") as f:
-                    bundle = json.load(f)
-                # retry a few times on 429/5xx
-                for attempt in range(4):
-                    resp = await post_bundle(session, fhir_store, bundle)
-                    if resp.status_code < 300:
-                        success += 1
-                        break
-                    if resp.status_code in (429, 500, 502, 503, 504):
-                        back = (2 ** attempt) + random.random()
-                        await asyncio.sleep(back)
+    # Up to max_in_flight posts overlap their round trips; send starts are
+    # still spaced 1/max_qps apart so the store sees the same request rate.
+    interval = 1.0 / max_qps if max_qps > 0 else 0
+    in_flight = max(1, max_in_flight)
+    sem = asyncio.Semaphore(in_flight)
+    breaker = Breaker()
+    pace_lock = asyncio.Lock()
+    next_slot = 0.0
+
+    async def _pace() -> None:
+        nonlocal next_slot
+        if not interval:
+            return
+        loop = asyncio.get_running_loop()
+        async with pace_lock:
+            now = loop.time()
+            wait = next_slot - now
+            next_slot = max(now, next_slot) + interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _send(session: httpx.AsyncClient, group: List[Path]) -> None:
+        # A merged group is one transaction: it succeeds or fails as a whole.
+        nonlocal success, failed
+        names = ", ".join(p.name for p in group)
+        # A single bundle is resent straight from its file. A merged group is
+        # built once; if it has to be retried it is spilled to a temp file.
+        body_path: Optional[Path] = group[0] if len(group) == 1 else None
+        spilled = False
+        try:
+            # retry a few times on 429/5xx. The body is loaded inside the slot
+            # and dropped before any backoff sleep, so at most max_in_flight
+            # bodies are in memory and a group backing off lets others run.
+            for attempt in range(max_retries + 1):
+                async with sem:
+                    # Checked under the slot, right before sending: a task that
+                    # queued while the breaker was closed must not slip past it
+                    # once it has opened, and only one slot holder can probe.
+                    admitted = breaker.allow()
+                    if admitted:
+                        try:
+                            if body_path is None:
+                                content = await asyncio.to_thread(merge_bundles, group)
+                            else:
+                                content = await asyncio.to_thread(body_path.read_bytes)
+                            await _pace()
+                            resp = await post_bundle(session, endpoint, content)
+                        except BaseException as e:
+                            # A network error counts against the endpoint; so
+                            # does any failure of an admitted probe, else the
+                            # breaker would stay half-open for good.
+                            if isinstance(e, httpx.TransportError) or breaker.state == "half_open":
+                                breaker.record(False)
+                            raise
+                if not admitted:
+                    # Wait out the cooldown (outside the slot) and ask again;
+                    # each wait uses up one of the group's attempts.
+                    if attempt < max_retries:
+                        await asyncio.sleep(breaker.retry_in())
                         continue
-                    failed += 1
-                    errors.append(f"{path.name}: {resp.status_code} {resp.text[:200]}")
+                    failed += len(group)
+                    errors.append(f"{names}: skipped, FHIR endpoint circuit open")
                     break
-                if interval:
-                    await asyncio.sleep(interval)
-            except Exception as e:
-                failed += 1
-                errors.append(f"{path.name}: {e}")
+                # Only server-side failures count; a 4xx still means the store is up.
+                breaker.record(resp.status_code < 500)
+                if resp.status_code < 300:
+                    success += len(group)
+                    _record(group)
+                    break
+                if resp.status_code in RETRYABLE_STATUS and attempt < max_retries:
+                    if body_path is None:
+                        body_path = await asyncio.to_thread(_spill, content)
+                        spilled = True
+                    # resp.request still references the body
+                    delay = retry_delay(resp, attempt)
+                    content = resp = None
+                    await asyncio.sleep(delay)
+                    continue
+                failed += len(group)
+                errors.append(f"{names}: {resp.status_code} {resp.text[:200]}")
+                break
+        except Exception as e:
+            failed += len(group)
+            errors.append(f"{names}: {e}")
+        finally:
+            if spilled:
+                body_path.unlink(missing_ok=True)
+
+    # Shared organization/practitioner bundles go first, one per request, so
+    # the conditional references in patient bundles can resolve.
+    # Bundles already ingested into this store (same bytes, recorded in the
+    # manifest next to the output dir) are skipped, e.g. on a rerun or when
+    # earlier runs' files are still in the output dir.
+    manifest = manifest or bundles_dir.parent / ".uploaded_hashes"
+    uploaded = load_manifest(manifest)
+    digests = await asyncio.to_thread(bundle_digests, files, fhir_store)
+    pending = [p for p in files if digests[p] not in uploaded]
+    skipped = len(files) - len(pending)
+    success += skipped
+    files = pending
+
+    def _record(group: List[Path]) -> None:
+        with manifest.open("a") as f:
+            f.write("".join(digests[p] + "\n" for p in group))
+
+    shared = [p for p in files if is_shared_bundle(p)]
+    patients = [p for p in files if not is_shared_bundle(p)]
+    groups = group_bundles(patients, max(1, bundles_per_request), request_bytes)
+
+    endpoint = _resolve_endpoint(fhir_store)
+    headers = {"Content-Type": "application/fhir+json; charset=utf-8"}
+    limits = httpx.Limits(max_connections=in_flight, max_keepalive_connections=in_flight)
+    timeout = httpx.Timeout(60.0, connect=5.0)
+    async with httpx.AsyncClient(headers=headers, auth=BearerAuth(), limits=limits,
+                                 timeout=timeout, http2=True) as session:
+        for path in shared:
+            await _send(session, [path])
+        async with asyncio.TaskGroup() as tg:
+            for g in groups:
+                tg.create_task(_send(session, g))
 
-    return {"success": success, "failed": failed, "errors": errors[:20]}
+    return {"success": success, "skipped": skipped, "failed": failed, "errors": errors[:20]}
 
 
-def execute(cfg: RunConfig) -> Dict[str, Any]:
-    ensure_assets(cfg.country)
-    out_dir = run_synthea(cfg)
+async def execute(cfg: RunConfig) -> Dict[str, Any]:
+    await asyncio.to_thread(ensure_assets, cfg.country)
+    out_dir = await run_synthea(cfg)
     result = {
         "generated_dir": str(out_dir),
         "count": cfg.count,
@@ -240,6 +676,7 @@ def execute(cfg: RunConfig) -> Dict[str, Any]:
         "city": cfg.city,
         "country": cfg.country,
     }
-    upload = asyncio.run(upload_bundles(cfg.fhir_store, out_dir, cfg.max_qps, cfg.dry_run))
+    upload = await upload_bundles(cfg.fhir_store, out_dir, cfg.max_qps, cfg.dry_run, cfg.max_in_flight,
+                                  cfg.bundles_per_request, cfg.request_bytes, cfg.max_retries)
     result.update(upload)
     return result